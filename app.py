@@ -1,288 +1,140 @@
+import io
+from contextlib import nullcontext
+
 import streamlit as st
 import pandas as pd
-import io
-import re
-import json
-from openai import AzureOpenAI # Use the OpenAI library for Azure
+
+from eswriter import (
+    CACHE_MODES,
+    DEFAULT_MAX_CONCURRENCY,
+    EXECUTION_MODES,
+    CheckpointJournal,
+    ProgressReporter,
+    RunMetrics,
+    compare_score_prompt_tokens,
+    connection_stats,
+    dataframe_hash,
+    df_to_excel_bytes,
+    diff_inputs,
+    find_failed_rows,
+    format_diff,
+    get_sample_comments_df,
+    get_sample_scores_df,
+    get_summary_cache,
+    journal_path_for,
+    process_comments_and_append,
+    process_scores,
+    process_scores_with_comments,
+    regenerate_changed,
+    retry_failed_rows,
+    settings_from_secrets,
+)
 
 # --- Helper Functions ---
 
-def get_sample_scores_df():
-    """Creates a sample DataFrame for the scores file."""
-    data = {
-        'Person': ['Indicator Text', 'EO1'],
-        'Adaptability': ['Adaptability', 4],
-        'Adaptability 1': ["Effectively navigates and leads teams through changes, minimizing disruption and maintaining morale.", 4],
-        'Adaptability 2': ["Quickly learns from experiences and applies insights to new situations, demonstrating a commitment to continuous improvement.", 4],
-        'Adaptability 3': ["Welcomes diverse perspectives and ideas, encouraging creative problem-solving and innovation.", 4],
-        'Adaptability 4': ["Displays personal resilience, remains calm and effective in times of crisis and ambiguity.", 4],
-        'Capability Development': ['Capability Development', 3],
-        'Capability Development 1': ["Identifies current skills and competencies within the team and assesses gaps relative to future needs, informing targeted development initiatives.", 2.5],
-        'Capability Development 2': ["Engages in coaching to develop team members' skills, providing guidance and support.", 3.5],
-        'Capability Development 3': ["Delegates responsibilities effectively encouraging team members to take ownership of their work.", 3],
-        'Capability Development 4': ["Proactively identifies and nurtures high-potential team members, ensuring that the organization has the necessary talent to meet current and future challenges.", 3],
-        'Decision Making and Takes Accountability': ['Decision Making and Takes Accountability', 4.8],
-        'Decision Making and Takes Accountability 1': ["Show the ability to act assertively and take independent and tough decisions even when they are unpopular.", 4.5],
-        'Decision Making and Takes Accountability 2': ["Displays confidence and credibility in decision-making, skilfully articulating decisions to garner support and alignment from others.", 5],
-        'Decision Making and Takes Accountability 3': ["Identifies potential risks associated with tactical decisions and evaluates their implications on success of the overall goals.", 4.5],
-        'Decision Making and Takes Accountability 4': ["Utilizes critical thinking to assess options and make informed decisions that align with objectives and values.", 5],
-        'Effective Communication and Influence': ['Effective Communication and Influence', 3.5],
-        'Effective Communication and Influence 1': ["Clearly articulates ideas and information in ensuring understanding.", 4],
-        'Effective Communication and Influence 2': ["Seeks common ground and influences others towards win-win outcomes, facilitating agreement between different parties.", 4],
-        'Effective Communication and Influence 3': ["Demonstrates strong listening skills, ensuring that team members feel heard and understood.", 2.5],
-        'Effective Communication and Influence 4': ["Adjusts communication style and approach based on the audience and context, ensuring effective engagement with diverse groups.", 3.5],
-        'Initiative': ['Initiative', 3.8],
-        'Initiative 1': ["Takes the initiative to identify and pursue opportunities, demonstrating a willingness to act without being prompted.", 4],
-        'Initiative 2': ["Sets ambitious objectives and consistently seeks ways to exceed expectations, demonstrating a strong commitment to achieving results.", 4],
-        'Initiative 3': ["Displays grit in the achievement of challenging goals, pushing boundaries for self and others performance.", 3.5],
-        'Initiative 4': ["Consistently takes action beyond immediate responsibilities to achieve goals.", 3.5],
-        'Inspirational Leadership': ['Inspirational Leadership', 3.4],
-        'Inspirational Leadership 1': ["Develops a sense of common vision and purpose in one's team that drives activity and creates motivation to achieve overall goals.", 4],
-        'Inspirational Leadership 2': ["Collaborates and works with others effectively, demonstrating the ability to judge what is the most appropriate leadership style (e.g. directive, collaborative, etc.)", 3.5],
-        'Inspirational Leadership 3': ["Demonstrates awareness of one’s own emotions and those of others, is aware of his/her impact on others and uses this understanding to inspire others.", 3],
-        'Inspirational Leadership 4': ["Recognizes the individual styles of each team member and proactively manages them in ways that draw out their best contributions.", 3],
-        'Strategic Thinking': ['Strategic Thinking', 4],
-        'Strategic Thinking 1': ["Monitors and predicts key trends in the industry to inform the future direction of the organization.", 4],
-        'Strategic Thinking 2': ["Identifies and assesses potential disruptors and develops strategies to proactively navigate them.", 4],
-        'Strategic Thinking 3': ["Proactively identifies new opportunities that align with organizational goals and capabilities.", 4],
-        'Strategic Thinking 4': ["Translates complex strategic organizational goals into meaningful actions across teams and functions.", 4],
-        'Systematic Analysis and Planning': ['Systematic Analysis and Planning', 2.8],
-        'Systematic Analysis and Planning 1': ["Delivers high-quality results consistently, demonstrating effective project management skills.", 3],
-        'Systematic Analysis and Planning 2': ["Creates detailed action plans that outline the steps, resources, and timelines required to achieve strategic objectives, ensuring effective execution and accountability.", 3],
-        'Systematic Analysis and Planning 3': ["Effectively allocates resources (time, personnel, budget) to optimize project outcomes and align with strategic priorities.", 2.5],
-        'Systematic Analysis and Planning 4': ["Establishes metrics and benchmarks to evaluate progress and effectiveness of plans, making adjustments as necessary to achieve desired results.", 2.5]
-    }
-    return pd.DataFrame(data)
-
-def get_sample_comments_df():
-    """Creates a sample DataFrame for the comments file."""
-    data = {
-        'Person Code': ['EO1', 'EO1', 'E32', 'E32'],
-        'Comments': [
-            'He needs to be more vocal in leadership meetings.',
-            'His project planning documents are very detailed and helpful, but he sometimes misses the bigger picture on resource allocation.',
-            'A bit quiet, but very reliable once a task is assigned.',
-            'Would like to see him present his ideas with more confidence to senior stakeholders.'
-        ]
-    }
-    return pd.DataFrame(data)
-
-
-def df_to_excel_bytes(df):
-    """Converts a DataFrame to an in-memory Excel file (bytes)."""
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-    output.seek(0)
-    return output.getvalue()
-
-
-def get_score_summary_prompt():
-    """Returns the prompt for generating the main summary from scores."""
-    return """
-**## Persona**
-You are an expert talent management analyst and a master writer. Your style is formal, professional, objective, and constructive. You synthesize quantitative performance data into a rich, qualitative, behavioral-focused narrative. You are writing for a male individual, using the third person (`he`/`his`/`him`).
-
-**## Core Objective**
-Generate a sophisticated, multi-paragraph performance summary based on scores from 8 leadership competencies. The summary will have 2 or 3 paragraphs based on the logic below. The summary must be generated in both English and Arabic.
-
-**## Input Data Profile**
-You will receive a data set for one individual containing: 8 Competency Names and their average scores, plus 4 Indicator Scores and Texts for each competency.
-
-**## Core Logic & Execution Flow**
-
-**Step 1: Data Analysis & Categorization**
-1.  Categorize each of the 8 competencies based on its average score:
-    * **Clear Strength:** Average score >= 4.0
-    * **Potential Strength:** Average score between 2.6 and 3.9
-    * **Development Area:** Average score <= 2.5
-2.  Count the number of distinct categories present for the candidate (1, 2, or 3).
-
-**Step 2: Dynamic Summary Construction**
-1.  **Mandatory Opening:** The English summary MUST begin with this exact text: "Your participation in the assessment center provided insight into how you demonstrate the leadership competencies in action. The feedback below highlights observed strengths and opportunities for development to support your continued growth."
-2.  **Paragraphing Rules:** Follow this logic to structure the report:
-
-    * **IF 3 Categories are present (Strengths, Potential, and Development):**
-        * **Paragraph 1 (Clear Strengths):** Start with "You display clear strengths in several areas of leadership." Detail all "Clear Strength" competencies. Synthesize multiple high-scoring indicators into a narrative and add a concluding phrase about the impact.
-        * **Paragraph 2 (Potential Strengths):** Start with "In addition, there are areas where you demonstrate potential strengths that can be further leveraged." Detail all "Potential Strength" competencies. Describe the positives, then transition ("However, there is room to...") to explain the development gap.
-        * **Paragraph 3 (Development Areas):** Start with "In relation to the development areas..." Detail all "Development Area" competencies. **This paragraph must be purely developmental.** Focus only on what needs improvement based on the lowest-scoring indicators. Do not mix in positive framing.
-
-    * **IF 2 Categories are present:**
-        * **Paragraph 1:** Address the more positive of the two categories (Strengths > Potential Strengths).
-        * **Paragraph 2:** Address the remaining category. The language must be purely developmental if it is the "Development Area" category.
-
-    * **IF only 1 Category is present (e.g., all are 'Clear Strengths'):**
-        * **Paragraph 1:** Address the top half of the competencies (those with the highest average scores).
-        * **Paragraph 2:** Address the bottom half of the competencies. Even if they are still positive, frame this paragraph as covering competencies that, while strong, are not as pronounced as those in the first paragraph.
-        * The same logic applies if all are 'Potential Strengths' or all are 'Development Areas'. This ensures a minimum of two paragraphs.
-
-**## Writing Standards & Constraints**
-* **Word Count:** Maximum 400 words total per language (excluding the mandatory opening).
-* **Source Fidelity:** Base all statements *strictly* on the indicator language.
-* **Behavioral Focus:** No technical or industry-specific jargon.
-* **Output Separator:** You MUST separate the English summary from the Arabic summary with the exact delimiter: '---ARABIC_SUMMARY---'.
-
-**## Bilingual Generation Mandate**
-* Generate in **both English and Arabic**, following the same dynamic structure and professional tone.
-* **Arabic Opening:** The first sentence thanking the participant MUST be in formal, written Arabic (`Lughat al-Fusha`), for example: "نشكرك على مشاركتك في مركز التقييم، مما أتاح لنا رؤية متعمقة لكيفية تجسيدك للكفاءات القيادية عمليًا."
-
----
-**## TASK: GENERATE SCORE-BASED SUMMARY FOR THE FOLLOWING PERSON**
-"""
-
-def get_comment_summary_prompt():
-    """Returns the new, specialized prompt for summarizing qualitative comments."""
-    return """
-**## Persona**
-You are a discerning talent management analyst, skilled at synthesizing raw, unstructured feedback into a concise and professional summary. Your focus is purely on constructive, developmental themes.
-
-**## Core Objective**
-Analyze a list of raw comments for an individual and generate a single, final summary paragraph. This paragraph should be no more than 50 words. The summary must be in both English and Arabic.
-
-**## Input Data Profile**
-1.  **The Main Report:** The already-written, score-based summary.
-2.  **Raw Comments:** A list of verbatim comments from colleagues.
-
-**## Core Logic & Execution Flow**
-1.  **Filter Comments:** First, you MUST filter the raw comments based on these rules:
-    * **IGNORE:** Offensive, irrelevant, purely personal, or overly judgmental comments.
-    * **FOCUS ON:** Developmental aspects, constructive criticism, and actionable feedback.
-2.  **Check for Contradictions:** **This is the most important rule.** Compare the themes in the filtered comments with the main report provided. If a comment's theme directly contradicts a "Clear Strength" identified in the main report, you MUST ignore that comment. The main report is the primary source of truth.
-3.  **Synthesize Themes:** From the remaining, non-contradictory comments, identify 1-2 key developmental themes. If the comments are varied, select the most impactful points.
-4.  **Draft the Summary:** Write a single paragraph that summarizes these themes.
-    * **Introduction:** Start with a phrase like "Additionally, feedback suggests..." or "Further feedback indicates...".
-    * **Body:** Concisely state the key themes. Rephrase any judgmental language into professional, developmental terms (e.g., "He is too quiet" becomes "he would benefit from increasing his visibility in senior forums.").
-5.  **Final Polish:** Ensure the paragraph flows naturally when appended to the main report.
-
-**## Writing Standards & Constraints**
-* **Word Count:** Maximum 50 words per language.
-* **Tone:** Professional, constructive, and forward-looking.
-* **Consistency:** The summary MUST NOT contradict the main report.
-* **Output Separator:** You MUST separate the English summary from the Arabic summary with the exact delimiter: '---ARABIC_SUMMARY---'.
-
-
-**## Bilingual Generation Mandate: English and Arabic**
-* **Primary Task:** Generate the summary in **both English and Arabic**, following all rules above.
-* **Arabic Language Standards:**
-    * **Nuance and Professionalism:** The Arabic translation must not be a literal, word-for-word translation. It must be crafted with the nuance, formality, and flow of a native Arabic-speaking HR professional.
-    * **Tone:** The tone should be formal, respectful, and constructive, using professional terminology appropriate for a corporate setting.
-    * **Contextual Integrity:** Ensure the meaning and intent of the developmental feedback are preserved and culturally aligned.
-
----
-**## TASK: ANALYZE THE FOLLOWING COMMENTS AND GENERATE A 50-WORD SUMMARY PARAGRAPH TO APPEND TO THE MAIN REPORT PROVIDED.**
-"""
-
-def generate_summary_from_llm(prompt):
-    """
-    FIXED: This function now makes a real API call to the Azure OpenAI gpt-4o model
-    to generate a unique, high-quality summary based on the provided prompt.
-    It reads credentials from st.secrets using a simpler format.
-    """
-    try:
-        # Get credentials from Streamlit secrets with a simpler structure
-        azure_endpoint = st.secrets["azure_endpoint"]
-        api_key = st.secrets["azure_api_key"]
-        deployment_name = st.secrets["azure_deployment_name"]
-        # A common API version is used here. You might need to update it based on your Azure setup.
-        api_version = "2024-02-01" 
-
-        # Initialize the AzureOpenAI client
-        client = AzureOpenAI(
-            azure_endpoint=azure_endpoint,
-            api_key=api_key,
-            api_version=api_version,
-        )
+# Characters of each in-flight response shown in the live preview.
+PREVIEW_CHARS = 300
 
-        # Create the payload for the API call
-        message_text = [{"role": "user", "content": prompt}]
-
-        # Make the API call
-        completion = client.chat.completions.create(
-            model=deployment_name,
-            messages=message_text,
-            temperature=0.7,
-            max_tokens=1000, # Increased to ensure enough space for both languages
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0,
-            stop=None
-        )
+class StreamlitReporter(ProgressReporter):
+    """Shows pipeline progress with a progress bar and a line per finished person."""
 
-        # Parse the response
-        full_response_text = completion.choices[0].message.content
+    def __init__(self):
+        self.progress_bar = st.progress(0)
+        self.live_preview = st.empty()
+
+    def start(self, total):
+        self.progress_bar.progress(0 if total else 1.0)
+
+    def advance(self, done, total, message):
+        st.write(message)
+        self.progress_bar.progress(done / total)
+
+    def preview(self, streams):
+        if not streams:
+            self.live_preview.empty()
+            return
+        self.live_preview.markdown("\n\n".join(
+            f"**{label}** (first token after {first_token:.1f}s, {len(text.split())} words so far)  \n…{text[-PREVIEW_CHARS:]}"
+            for label, text, first_token in streams
+        ))
+
+    def info(self, message):
+        st.info(message)
+
+    def error(self, message):
+        st.error(message)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def excel_bytes(content_hash, _df, _metrics=None):
+    """Workbook bytes for a dataframe, only rebuilt when its content hash changes rather than on every rerun."""
+    with _metrics.timer("export_xlsx") if _metrics is not None else nullcontext():
+        return df_to_excel_bytes(_df)
+
+
+def download_bytes(df):
+    return excel_bytes(dataframe_hash(df), df, run_metrics)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def score_token_report(scores_bytes, _scores_df):
+    """compare_score_prompt_tokens for an upload, computed once per file rather than on every rerun."""
+    return compare_score_prompt_tokens(_scores_df)
 
-        # Split English and Arabic summaries
-        if '---ARABIC_SUMMARY---' in full_response_text:
-            eng_summary, ar_summary = full_response_text.split('---ARABIC_SUMMARY---', 1)
-            return eng_summary.strip(), ar_summary.strip()
-        else:
-            return full_response_text.strip(), "Arabic summary could not be parsed. Delimiter '---ARABIC_SUMMARY---' not found."
 
+@st.cache_data(max_entries=16, show_spinner=False)
+def parse_workbook(data, _metrics=None):
+    """pd.read_excel for a workbook's bytes, parsed and timed once per file rather than on every rerun."""
+    with _metrics.timer("read_excel") if _metrics is not None else nullcontext():
+        return pd.read_excel(io.BytesIO(data), engine='openpyxl')
+
+
+def read_workbook(source):
+    """The dataframe for an uploaded file or bytes buffer, see parse_workbook."""
+    return parse_workbook(source.getvalue(), run_metrics)
+
+
+def get_azure_settings():
+    """Reads the Azure OpenAI credentials from st.secrets, showing an error if one is missing."""
+    try:
+        return settings_from_secrets(st.secrets)
     except KeyError as e:
         st.error(f"Missing Secret: Please ensure your secrets.toml file contains the necessary Azure OpenAI credentials. Missing key: {e}")
-        return "Error: Missing configuration.", "Error: Missing configuration."
-    except Exception as e:
-        st.error(f"An error occurred while calling the OpenAI API: {e}")
-        return f"Error: API call failed.", "Error: API call failed."
-
-
-def process_scores(df):
-    """Processes the scores dataframe to generate initial summaries."""
-    results = []
-    indicator_definitions = df.iloc[0]
-    people_data = df.iloc[1:]
-    score_prompt_template = get_score_summary_prompt()
-
-    progress_bar = st.progress(0)
-    total_people = len(people_data)
-    for i, (_, row) in enumerate(people_data.iterrows()):
-        person_name = row.iloc[0]
-        if pd.isna(person_name) or 'ERROR' in str(row.iloc[1]): continue
-        
-        st.write(f"Generating summary for {person_name}...")
-
-        person_data_prompt = f"**Person's Name:** {person_name}\n\n**Competency Data:**\n"
-        for j in range(8):
-            comp_col_index = 1 + (j * 5)
-            if comp_col_index >= len(df.columns): break
-            person_data_prompt += f"\n**- Competency: {df.columns[comp_col_index]}** (Average Score: {row[comp_col_index]})\n"
-            for k in range(4):
-                ind_col_index = comp_col_index + 1 + k
-                if ind_col_index >= len(df.columns): break
-                person_data_prompt += f"  - Indicator: '{indicator_definitions[ind_col_index]}' | Score: {row[ind_col_index]}\n"
-
-        full_prompt = score_prompt_template + person_data_prompt
-        eng_summary, ar_summary = generate_summary_from_llm(full_prompt)
-        results.append({"Person": person_name, "English Summary": eng_summary, "Arabic Summary": ar_summary})
-        progress_bar.progress((i + 1) / total_people)
-        
-    return pd.DataFrame(results)
-
-def process_comments_and_append(results_df, comments_df):
-    """Processes comments and appends them to the existing summaries."""
-    comment_prompt_template = get_comment_summary_prompt()
-    
-    progress_bar = st.progress(0)
-    total_people = len(results_df)
-    for i, row in results_df.iterrows():
-        person_code = row['Person']
-        main_eng_summary = row['English Summary']
-        
-        person_comments = comments_df[comments_df['Person Code'] == person_code]['Comments'].tolist()
-
-        if person_comments:
-            st.write(f"Summarizing comments for {person_code}...")
-            comment_data_prompt = f"**Main Report:**\n{main_eng_summary}\n\n**Raw Comments to Summarize:**\n- {'\n- '.join(person_comments)}"
-            full_prompt = comment_prompt_template + comment_data_prompt
-            
-            eng_comment_summary, ar_summary = generate_summary_from_llm(full_prompt)
-
-            results_df.at[i, 'English Summary'] += f"\n\n{eng_comment_summary}"
-            results_df.at[i, 'Arabic Summary'] += f"\n\n{ar_comment_summary}"
-        
-        progress_bar.progress((i + 1) / total_people)
-            
-    return results_df
+        return None
+
+
+def open_journal(*inputs):
+    """Checkpoint journal for a run over these uploaded files, or None when resuming is turned off."""
+    return CheckpointJournal(journal_path_for(*inputs)) if resume_runs else None
+
+
+def retry_failed_button(key, comments_file_bytes=None, fused=True):
+    """Offers to regenerate only the rows of st.session_state[key] that fail validation."""
+    failed_count = int(find_failed_rows(st.session_state[key]).sum())
+    if not failed_count:
+        return
+    st.warning(f"{failed_count} row(s) failed validation (missing Arabic text or opening, over the word limit, or an API error). See the Status column for details.")
+    if st.button(f"Retry failed rows only ({failed_count})", key=f"retry_{key}"):
+        settings = get_azure_settings()
+        if settings:
+            with st.spinner("Regenerating failed rows via Azure OpenAI..."):
+                inputs = [st.session_state['scores_file_bytes']] + ([comments_file_bytes] if comments_file_bytes else [])
+                st.session_state[key] = retry_failed_rows(
+                    st.session_state[key],
+                    read_workbook(io.BytesIO(st.session_state['scores_file_bytes'])),
+                    settings,
+                    comments_df=read_workbook(io.BytesIO(comments_file_bytes)) if comments_file_bytes else None,
+                    fused=fused,
+                    max_workers=max_concurrency,
+                    cache_mode=cache_mode,
+                    execution_mode=execution_mode,
+                    journal=open_journal(*inputs),
+                    reporter=StreamlitReporter(),
+                    stream=stream_responses,
+                    compact=compact_prompts,
+                    metrics=run_metrics,
+                )
+
 
 # --- Streamlit App UI ---
 
@@ -301,33 +153,174 @@ st.info("""
     ```
 """)
 
+st.sidebar.markdown("### Generation Settings")
+max_concurrency = st.sidebar.number_input(
+    "Max concurrent API calls",
+    min_value=1,
+    max_value=64,
+    value=DEFAULT_MAX_CONCURRENCY,
+    help="How many people are summarized in parallel. Lower this if your Azure deployment is being throttled."
+)
+execution_mode = st.sidebar.radio(
+    "Execution mode",
+    options=list(EXECUTION_MODES),
+    format_func=EXECUTION_MODES.get,
+    help="Batch API jobs cost less but can take hours. Keep this tab open or re-run the same files later to pick the job up again. Requests that fail in a batch are not re-sent as interactive calls; re-run to submit them as a new batch."
+)
+stream_responses = st.sidebar.checkbox(
+    "Stream responses",
+    value=True,
+    help="Show summaries as they are written, with the time to first token. Does not apply to Batch API jobs."
+)
+cache_mode = st.sidebar.selectbox(
+    "Response cache",
+    options=list(CACHE_MODES),
+    format_func=CACHE_MODES.get,
+    help="Cached summaries are reused when the prompt, deployment and sampling settings are unchanged."
+)
+summary_cache = get_summary_cache()
+cache_stats = summary_cache.stats
+st.sidebar.caption(
+    f"Cache: {summary_cache.entry_count()} entries | {cache_stats['hits']} hits | "
+    f"{cache_stats['misses']} misses | {cache_stats['evictions']} evicted"
+)
+pool_stats = connection_stats.snapshot()
+st.sidebar.caption(
+    f"HTTP pool: {pool_stats['requests']} requests over {pool_stats['new_connections']} connections | "
+    f"{pool_stats['reused']} reused | {pool_stats['http2_requests']} via HTTP/2"
+)
+compact_prompts = st.sidebar.checkbox(
+    "Precompute competency categories",
+    value=True,
+    help="Categorise competencies and group paragraphs locally and send each person as compact JSON, instead of the full indicator text."
+)
+resume_runs = st.sidebar.checkbox(
+    "Resume interrupted runs",
+    value=True,
+    help="Finished people are checkpointed as they complete. Re-running the same files only generates the people still missing."
+)
+if st.sidebar.button("Clear response cache"):
+    summary_cache.clear()
+    st.sidebar.success("Response cache cleared.")
+# Collects stage timings and call statistics for every run in this session; see the Diagnostics panel.
+run_metrics = st.session_state.setdefault('run_metrics', RunMetrics())
+
 st.markdown("### 1. Upload Quantitative Scores File")
 with st.expander("Show Score File Instructions"):
     st.write("Upload an Excel file with competency scores. The first row should be headers, the second row must contain indicator definitions, and subsequent rows should have person IDs and scores.")
     sample_scores_df = get_sample_scores_df()
     st.download_button(
         label="📥 Download Scores Template",
-        data=df_to_excel_bytes(sample_scores_df),
+        data=download_bytes(sample_scores_df),
         file_name="sample_scores_template.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
 uploaded_scores_file = st.file_uploader("Choose a scores file", type="xlsx", key="scores_uploader")
+early_comments_file = st.file_uploader(
+    "(Optional) Comments file to include in the same pass",
+    type="xlsx",
+    key="early_comments_uploader",
+    help="With comments uploaded here, each person with comments gets one call that writes both the score summary and the comment paragraph, or two calls if you turn that off below. Leave empty to add comments afterwards in step 3."
+)
+previous_report_file = st.file_uploader(
+    "(Optional) Previous report for this cohort",
+    type="xlsx",
+    key="previous_report_uploader",
+    help="People whose scores and comments are unchanged since this report keep their summaries; only changed and new people are regenerated. Without it, the last results of this session are used."
+)
 
 if uploaded_scores_file:
     try:
-        scores_df = pd.read_excel(uploaded_scores_file, engine='openpyxl')
-        if st.button("Generate Summaries from Scores", key="generate_scores"):
-            with st.spinner("Analyzing scores and generating summaries via Azure OpenAI... This may take a moment."):
-                results_df = process_scores(scores_df)
-                st.session_state['results_df'] = results_df
-                st.success("Score-based summaries generated successfully!")
+        scores_df = read_workbook(uploaded_scores_file)
+        early_comments_df = read_workbook(early_comments_file) if early_comments_file else None
+        token_report = score_token_report(uploaded_scores_file.getvalue(), scores_df)
+        st.caption(
+            f"Input tokens per person{'' if token_report['exact'] else ' (estimated)'}: "
+            f"{token_report['full']['request_tokens']:.0f} with full prompts, "
+            f"{token_report['compact']['request_tokens']:.0f} with precomputed categories "
+            f"({token_report['compact']['person_tokens']:.0f} of them person-specific, vs {token_report['full']['person_tokens']:.0f})."
+        )
+
+        # Compare against an uploaded report, else this session's last results of the same kind.
+        if previous_report_file:
+            previous_df = read_workbook(previous_report_file)
+        else:
+            previous_df = st.session_state.get('final_df' if early_comments_file else 'results_df')
+        incremental = False
+        if previous_df is not None:
+            diff = diff_inputs(previous_df, scores_df, early_comments_df)
+            st.info(f"Compared with the previous results: {format_diff(diff)}")
+            with st.expander("Show changed, new and removed people"):
+                for change in ("changed", "new", "removed"):
+                    st.write(f"**{change.title()}:** {', '.join(str(person) for person in diff[change]) or 'none'}")
+            incremental = st.checkbox("Only regenerate changed and new people", value=True, key="incremental")
+
+        fused_comments = bool(early_comments_file) and st.checkbox(
+            "Write score summary and comment paragraph in one call",
+            value=True,
+            key="fused_comments",
+            help="Turn off to summarize the comments in a second call per person instead (two-stage), e.g. if integrated responses keep failing validation."
+        )
+        if early_comments_file and st.button("Generate Integrated Summaries", key="generate_fused"):
+            settings = get_azure_settings()
+            if settings:
+                with st.spinner("Analyzing scores and comments and generating summaries via Azure OpenAI... This may take a moment."):
+                    run_options = dict(
+                        max_workers=max_concurrency,
+                        cache_mode=cache_mode,
+                        execution_mode=execution_mode,
+                        journal=open_journal(uploaded_scores_file.getvalue(), early_comments_file.getvalue()),
+                        reporter=StreamlitReporter(),
+                        stream=stream_responses,
+                        metrics=run_metrics,
+                    )
+                    if incremental:
+                        final_df = regenerate_changed(
+                            previous_df, scores_df, settings, comments_df=early_comments_df, fused=fused_comments,
+                            compact=compact_prompts, **run_options,
+                        )
+                    elif fused_comments:
+                        final_df = process_scores_with_comments(scores_df, early_comments_df, settings, compact=compact_prompts, **run_options)
+                    else:
+                        results_df = process_scores(scores_df, settings, compact=compact_prompts, **run_options)
+                        final_df = process_comments_and_append(results_df, early_comments_df, settings, **run_options)
+                    # Both stages ran here, so there is nothing left to append comments to.
+                    st.session_state.pop('results_df', None)
+                    st.session_state['final_df'] = final_df
+                    st.session_state['scores_file_bytes'] = uploaded_scores_file.getvalue()
+                    st.session_state['final_comments_bytes'] = early_comments_file.getvalue()
+                    st.session_state['final_fused'] = fused_comments
+                    st.success("Integrated summaries generated successfully!")
+        elif not early_comments_file and st.button("Generate Summaries from Scores", key="generate_scores"):
+            settings = get_azure_settings()
+            if settings:
+                with st.spinner("Analyzing scores and generating summaries via Azure OpenAI... This may take a moment."):
+                    run_options = dict(
+                        max_workers=max_concurrency,
+                        cache_mode=cache_mode,
+                        execution_mode=execution_mode,
+                        journal=open_journal(uploaded_scores_file.getvalue()),
+                        reporter=StreamlitReporter(),
+                        stream=stream_responses,
+                        compact=compact_prompts,
+                        metrics=run_metrics,
+                    )
+                    if incremental:
+                        results_df = regenerate_changed(previous_df, scores_df, settings, **run_options)
+                    else:
+                        results_df = process_scores(scores_df, settings, **run_options)
+                    st.session_state.pop('final_df', None)
+                    st.session_state['results_df'] = results_df
+                    st.session_state['scores_file_bytes'] = uploaded_scores_file.getvalue()
+                    st.success("Score-based summaries generated successfully!")
     except Exception as e:
         st.error(f"Error processing scores file: {e}")
 
 if 'results_df' in st.session_state:
     st.markdown("---")
     st.markdown("### 2. Score-Based Summaries (Preview)")
+    retry_failed_button('results_df')
     st.dataframe(st.session_state['results_df'].head())
 
     st.markdown("---")
@@ -337,7 +330,7 @@ if 'results_df' in st.session_state:
         sample_comments_df = get_sample_comments_df()
         st.download_button(
             label="📥 Download Comments Template",
-            data=df_to_excel_bytes(sample_comments_df),
+            data=download_bytes(sample_comments_df),
             file_name="sample_comments_template.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -346,12 +339,26 @@ if 'results_df' in st.session_state:
 
     if uploaded_comments_file:
         try:
-            comments_df = pd.read_excel(uploaded_comments_file, engine='openpyxl')
-            if st.button("Incorporate Comments into Summaries", key="generate_comments"):
+            comments_df = read_workbook(uploaded_comments_file)
+            settings = get_azure_settings() if st.button("Incorporate Comments into Summaries", key="generate_comments") else None
+            if settings:
                 with st.spinner("Analyzing comments and updating summaries via Azure OpenAI..."):
                     current_results = st.session_state['results_df'].copy()
-                    final_df = process_comments_and_append(current_results, comments_df)
+                    final_df = process_comments_and_append(
+                        current_results,
+                        comments_df,
+                        settings,
+                        max_workers=max_concurrency,
+                        cache_mode=cache_mode,
+                        execution_mode=execution_mode,
+                        journal=open_journal(st.session_state['scores_file_bytes'], uploaded_comments_file.getvalue()),
+                        reporter=StreamlitReporter(),
+                        stream=stream_responses,
+                        metrics=run_metrics,
+                    )
                     st.session_state['final_df'] = final_df
+                    st.session_state['final_comments_bytes'] = uploaded_comments_file.getvalue()
+                    st.session_state['final_fused'] = False
                     st.success("Comments incorporated successfully!")
         except Exception as e:
             st.error(f"Error processing comments file: {e}")
@@ -359,10 +366,11 @@ if 'results_df' in st.session_state:
 if 'final_df' in st.session_state:
     st.markdown("---")
     st.markdown("### 4. Final Integrated Report")
+    retry_failed_button('final_df', st.session_state['final_comments_bytes'], fused=st.session_state['final_fused'])
     st.dataframe(st.session_state['final_df'])
     st.download_button(
         label="📥 Download Final Integrated Report",
-        data=df_to_excel_bytes(st.session_state['final_df']),
+        data=download_bytes(st.session_state['final_df']),
         file_name="final_integrated_summaries.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
@@ -371,7 +379,42 @@ elif 'results_df' in st.session_state and 'final_df' not in st.session_state:
     st.markdown("### 4. Download Score-Based Report")
     st.download_button(
         label="📥 Download Score-Based Report",
-        data=df_to_excel_bytes(st.session_state['results_df']),
+        data=download_bytes(st.session_state['results_df']),
         file_name="score_based_summaries.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
+
+# --- Diagnostics ---
+
+with st.expander("Diagnostics"):
+    metrics_summary = run_metrics.summary()
+    counters = metrics_summary['counters']
+    latency = metrics_summary['latency']
+    st.caption(
+        f"{counters.get('api_calls', 0)} API calls | {counters.get('cache_hits', 0)} cache hits | "
+        f"{counters.get('throttled', 0)} throttled | {counters.get('retries', 0)} retries | "
+        f"{counters.get('api_errors', 0)} errors | {counters.get('repaired', 0)} repaired | "
+        f"{counters.get('still_failing', 0)} still failing"
+    )
+    st.caption(
+        f"Call latency p50 {latency['p50_s']:.2f}s, p95 {latency['p95_s']:.2f}s, p99 {latency['p99_s']:.2f}s | "
+        f"{metrics_summary['tokens_per_second_per_call']:.1f} completion tokens/s per call, "
+        f"{metrics_summary['tokens_per_second_overall']:.1f} overall"
+    )
+    if metrics_summary['stages']:
+        st.dataframe(pd.DataFrame.from_dict(metrics_summary['stages'], orient='index'))
+    if latency['samples']:
+        # A table rather than a chart, which would sort the bucket labels alphabetically.
+        st.dataframe(pd.DataFrame({
+            "Latency": [f"≤ {bucket['le']}s" if bucket['le'] is not None else "slower" for bucket in latency['histogram']],
+            "Calls": [bucket['count'] for bucket in latency['histogram']],
+        }), hide_index=True)
+    st.download_button(
+        label="📥 Download Run Metrics (JSON)",
+        data=run_metrics.to_json(),
+        file_name="run_metrics.json",
+        mime="application/json"
+    )
+    if st.button("Reset metrics", key="reset_metrics"):
+        st.session_state['run_metrics'] = RunMetrics()
+        st.rerun()
@@ -0,0 +1,58 @@
+"""
+Compares per-person comment lookup in process_comments_and_append: the old boolean scan of
+comments_df for every person against the grouped index built once by index_comments.
+
+    python benchmarks/comment_lookup.py
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eswriter.prompts import index_comments, normalize_person_code
+
+PEOPLE = 1000
+COMMENT_COUNTS = [1_000, 10_000, 100_000]
+
+
+def make_comments_df(n_comments, n_people, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "Person Code": [f"E{rng.randrange(n_people)}" for _ in range(n_comments)],
+        "Comments": [f"Comment number {i} about meetings and planning." for i in range(n_comments)],
+    })
+
+
+def scan_lookup(person_codes, comments_df):
+    return [comments_df[comments_df['Person Code'] == code]['Comments'].tolist() for code in person_codes]
+
+
+def indexed_lookup(person_codes, comments_df):
+    comments_by_person = index_comments(comments_df)
+    return [comments_by_person.get(normalize_person_code(code), []) for code in person_codes]
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    person_codes = [f"E{i}" for i in range(PEOPLE)]
+    print(f"{PEOPLE} people")
+    print(f"{'comments':>10} {'scan (s)':>10} {'index (s)':>10} {'speedup':>9}")
+    for n_comments in COMMENT_COUNTS:
+        comments_df = make_comments_df(n_comments, PEOPLE)
+        scan_seconds, scanned = time_call(scan_lookup, person_codes, comments_df)
+        index_seconds, indexed = time_call(indexed_lookup, person_codes, comments_df)
+        assert scanned == indexed
+        print(f"{n_comments:>10} {scan_seconds:>10.3f} {index_seconds:>10.3f} {scan_seconds / index_seconds:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
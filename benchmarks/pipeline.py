@@ -0,0 +1,115 @@
+"""
+End-to-end throughput of the summary pipeline against the local fake Azure OpenAI server, on
+synthetic cohorts built from the sample scores template. Each cohort runs process_scores followed
+by process_comments_and_append (or process_scores_with_comments with --fused), with the response
+cache bypassed, and reports wall time, call latency percentiles, throttling and retries.
+
+    python benchmarks/pipeline.py --sizes 10 100 1000 --latency 0.2 --throttle-rate 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eswriter.excel import get_sample_scores_df
+from eswriter.fake_azure_openai import start_fake_server
+from eswriter.metrics import RunMetrics
+from eswriter.pipeline import process_comments_and_append, process_scores, process_scores_with_comments
+
+COHORT_SIZES = [10, 100, 1000, 5000]
+# Fraction of people who get comments, and how many each.
+COMMENTED_FRACTION = 0.6
+COMMENTS_PER_PERSON = (1, 4)
+COMMENT_TEXTS = [
+    "Runs meetings well and keeps the team focused on priorities.",
+    "Could delegate more instead of taking on every task personally.",
+    "Very supportive when new joiners need help getting started.",
+    "Sometimes slow to communicate changes in plans to stakeholders.",
+]
+
+
+def make_cohort(n_people, seed=0):
+    """Scores and comments dataframes for n_people, each a jittered copy of the sample person."""
+    rng = random.Random(seed)
+    sample_df = get_sample_scores_df()
+    header, person = sample_df.iloc[0].tolist(), sample_df.iloc[1].tolist()
+    rows = [header]
+    for i in range(n_people):
+        scores = [min(5.0, max(1.0, round(value + rng.uniform(-1, 1) * 2) / 2)) for value in person[1:]]
+        rows.append([f"E{i:05d}"] + scores)
+    scores_df = pd.DataFrame(rows, columns=sample_df.columns)
+
+    comments = []
+    for i in range(n_people):
+        if rng.random() < COMMENTED_FRACTION:
+            comments += [(f"E{i:05d}", rng.choice(COMMENT_TEXTS)) for _ in range(rng.randint(*COMMENTS_PER_PERSON))]
+    comments_df = pd.DataFrame(comments, columns=["Person Code", "Comments"])
+    return scores_df, comments_df
+
+
+def run_cohort(n_people, settings, fused, concurrency):
+    scores_df, comments_df = make_cohort(n_people)
+    metrics = RunMetrics()
+    run_options = {"max_workers": concurrency, "cache_mode": "bypass", "metrics": metrics}
+    with metrics.timer("total"):
+        if fused:
+            process_scores_with_comments(scores_df, comments_df, settings, **run_options)
+        else:
+            results_df = process_scores(scores_df, settings, **run_options)
+            process_comments_and_append(results_df, comments_df, settings, **run_options)
+    return metrics.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=COHORT_SIZES, help="Cohort sizes to run.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the fake server waits before each reply.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429.")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests-per-minute quota enforced by the fake server.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum concurrent API calls.")
+    parser.add_argument("--fused", action="store_true", help="Send scores and comments in one call per person.")
+    parser.add_argument("--json", help="Also write every cohort's full RunMetrics summary to this file.")
+    args = parser.parse_args()
+
+    # The pipeline's own progress and usage lines would drown out the table.
+    logging.disable(logging.INFO)
+    server = start_fake_server(latency=args.latency, throttle_rate=args.throttle_rate, rpm=args.rpm, retry_after=0.1)
+    settings = {
+        "azure_endpoint": f"http://127.0.0.1:{server.server_address[1]}",
+        "api_key": "fake",
+        "deployment_name": "gpt-4o",
+        "batch_deployment_name": "gpt-4o",
+    }
+
+    print(f"latency {args.latency}s, throttle rate {args.throttle_rate}, concurrency {args.concurrency}, {'fused' if args.fused else 'two-stage'}")
+    print(f"{'people':>7} {'wall (s)':>9} {'people/s':>9} {'calls':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'throttled':>10} {'retries':>8} {'errors':>7}")
+    summaries = {}
+    try:
+        for n_people in args.sizes:
+            start = time.perf_counter()
+            summary = run_cohort(n_people, settings, args.fused, args.concurrency)
+            wall = time.perf_counter() - start
+            summaries[n_people] = summary
+            counters, latency = summary["counters"], summary["latency"]
+            print(
+                f"{n_people:>7} {wall:>9.2f} {n_people / wall:>9.1f} {counters.get('api_calls', 0):>7} "
+                f"{latency['p50_s']:>8.3f} {latency['p95_s']:>8.3f} {counters.get('throttled', 0):>10} "
+                f"{counters.get('retries', 0):>8} {counters.get('api_errors', 0):>7}"
+            )
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Bilingual performance summary generation on Azure OpenAI, usable from Streamlit, the CLI or as a library."""
+from .batch import run_llm_calls_in_batch
+from .cache import SummaryCache, get_summary_cache
+from .checkpoint import CheckpointJournal, journal_path_for
+from .config import CACHE_MODES, DEFAULT_MAX_CONCURRENCY, EXECUTION_MODES, load_settings, settings_from_secrets
+from .excel import dataframe_hash, df_to_excel_bytes, get_sample_comments_df, get_sample_scores_df
+from .incremental import diff_inputs, format_diff, input_fingerprints
+from .llm import RateLimitScheduler, connection_stats, request_summary
+from .metrics import RunMetrics
+from .pipeline import process_comments_and_append, process_scores, process_scores_with_comments, regenerate_changed, retry_failed_rows, run_llm_calls_concurrently
+from .progress import ProgressReporter
+from .scoring import build_compact_payloads, score_people
+from .tokens import compare_score_prompt_tokens, count_tokens
+from .usage import UsageTracker, format_usage_report
+from .validation import find_failed_rows, validate_summary
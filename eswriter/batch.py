@@ -0,0 +1,208 @@
+"""
+Offline execution through the Azure OpenAI Batch API: every request of a stage is written to one
+JSONL file, submitted as a batch job, polled until it finishes and matched back by custom_id.
+eswriter.fake_azure_openai serves the same endpoints for testing without network access.
+"""
+import hashlib
+import json
+import time
+
+from openai.types.chat import ChatCompletion
+
+from .cache import SummaryCache, get_summary_cache
+from .config import AZURE_BATCH_API_VERSION, BATCH_COMPLETION_WINDOW, BATCH_POLL_INTERVAL
+from .llm import API_ERROR_RESULT, MISSING_ARABIC_MESSAGE, build_messages, get_azure_client, is_well_formed, parse_response, request_params
+from .progress import ProgressReporter
+from .usage import UsageTracker, format_usage_report
+
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def requests_hash(requests):
+    """Identifies a set of requests, so a journaled batch is only resumed for exactly the same input."""
+    digest = hashlib.sha256()
+    for request in requests:
+        digest.update(hashlib.sha256("".join(request).encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def build_batch_file(requests, custom_ids, deployment_name, structured=False):
+    """
+    The JSONL batch input file: one /chat/completions request per line, identified by custom_id.
+    structured switches on JSON mode for fused requests.
+    """
+    params = request_params(structured)
+    lines = []
+    for custom_id, request in zip(custom_ids, requests):
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {"model": deployment_name, "messages": build_messages(request), **params},
+        }, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def submit_batch(client, batch_file):
+    """Uploads the batch input file and starts the batch job. Returns the batch ID."""
+    input_file = client.files.create(file=("requests.jsonl", batch_file), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/chat/completions",
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_interval=BATCH_POLL_INTERVAL, on_poll=None):
+    """Polls a batch job until it reaches a terminal status and returns it. on_poll(batch) is called after each poll."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if on_poll:
+            on_poll(batch)
+        if batch.status in BATCH_TERMINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client, batch, usage=None, structured=False):
+    """
+    Downloads a finished batch's output and error files. Returns ({custom_id: (english, arabic)},
+    {custom_id: error message}). Requests missing from both files were never run. structured reads
+    the outputs as fused JSON responses.
+    """
+    results = {}
+    errors = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if response.get("status_code") != 200:
+                errors[entry["custom_id"]] = json.dumps(entry.get("error") or response.get("body"))
+                continue
+            completion = ChatCompletion.model_validate(response["body"])
+            if usage is not None:
+                usage.record(completion.usage, None)
+            choice = completion.choices[0]
+            eng_summary, ar_summary = parse_response(choice.message.content, structured, choice.finish_reason)
+            results[entry["custom_id"]] = (eng_summary, ar_summary if ar_summary is not None else MISSING_ARABIC_MESSAGE)
+
+    if batch.error_file_id:
+        for line in client.files.content(batch.error_file_id).text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                errors[entry["custom_id"]] = json.dumps(entry.get("error") or entry.get("response"))
+    return results, errors
+
+
+def run_llm_calls_in_batch(requests, settings, stage, on_complete=None, reporter=None, journal=None, poll_interval=BATCH_POLL_INTERVAL,
+                           structured=False, cache_mode="use", metrics=None, usage=None):
+    """
+    Batch API counterpart of run_llm_calls_concurrently: same request list, same result order and
+    the same on_complete(index, done_count, result, ok) callback, called once the batch has finished.
+    Requests with a cached summary are completed straight away unless cache_mode says otherwise, and
+    well-formed batch results are cached like interactive ones. If the checkpoint journal already
+    holds a batch for exactly the remaining requests, it is polled instead of submitting a new one,
+    unless that batch has already failed, expired or been cancelled. structured is as for
+    request_summary. If given, the batch's calls are added to the RunMetrics `metrics`, and to the
+    UsageTracker `usage` for the caller to report instead of being reported here.
+    """
+    reporter = reporter or ProgressReporter()
+    results = [None] * len(requests)
+    if not requests:
+        return results
+
+    calls_usage = UsageTracker()
+    cache = None if cache_mode == "bypass" else get_summary_cache()
+    params = request_params(structured)
+    cache_keys = [SummaryCache.make_key(build_messages(request), settings["batch_deployment_name"], params) for request in requests] if cache else None
+    done_count = 0
+    pending = []
+    for idx in range(len(requests)):
+        cached = cache.get(cache_keys[idx]) if cache is not None and cache_mode == "use" else None
+        if cached is None:
+            pending.append(idx)
+            continue
+        calls_usage.record_cache_hit()
+        results[idx] = cached
+        done_count += 1
+        if on_complete:
+            on_complete(idx, done_count, cached, True)
+    if not pending:
+        _report_usage(calls_usage, usage, reporter, metrics)
+        return results
+
+    client = get_azure_client(settings["azure_endpoint"], settings["api_key"], AZURE_BATCH_API_VERSION)
+    pending_requests = [requests[idx] for idx in pending]
+    key = requests_hash(pending_requests)
+    batch_id = journal.pending_batch(stage, key) if journal is not None else None
+    if batch_id:
+        status = client.batches.retrieve(batch_id).status
+        if status in BATCH_TERMINAL_STATUSES and status != "completed":
+            reporter.info(f"Journaled Batch API job {batch_id} ended with status '{status}'; submitting a new one.")
+            journal.drop_batch(stage, key)
+            batch_id = None
+        else:
+            reporter.info(f"Resuming Batch API job {batch_id}.")
+    if not batch_id:
+        custom_ids = [f"{stage}-{idx}" for idx in pending]
+        batch_id = submit_batch(client, build_batch_file(pending_requests, custom_ids, settings["batch_deployment_name"], structured))
+        if journal is not None:
+            journal.record_batch(stage, key, batch_id)
+        reporter.info(f"Submitted Batch API job {batch_id} with {len(pending)} request(s).")
+
+    last_state = []
+    def on_poll(batch):
+        # Only report changes; a batch can sit in one state for hours.
+        counts = batch.request_counts
+        state = (batch.status, counts.completed if counts else None, counts.failed if counts else None)
+        if last_state and last_state[-1] == state:
+            return
+        last_state.append(state)
+        if counts is not None and counts.total:
+            reporter.info(f"Batch {batch.id}: {batch.status}, {counts.completed}/{counts.total} done, {counts.failed} failed.")
+        else:
+            reporter.info(f"Batch {batch.id}: {batch.status}.")
+
+    batch = wait_for_batch(client, batch_id, poll_interval=poll_interval, on_poll=on_poll)
+    batch_results, batch_errors = read_batch_results(client, batch, usage=calls_usage, structured=structured)
+    missing = [idx for idx in pending if f"{stage}-{idx}" not in batch_results]
+    if batch.status != "completed":
+        # The whole job failed: one report instead of an error per request, and no resuming it next time.
+        reporter.error(
+            f"Batch API job {batch.id} ended with status '{batch.status}': {len(missing)} of {len(pending)} request(s) "
+            f"have no output and are marked as failed. Run again to submit them as a new batch."
+        )
+        if journal is not None:
+            journal.drop_batch(stage, key)
+
+    for idx in pending:
+        custom_id = f"{stage}-{idx}"
+        if custom_id in batch_results:
+            result = batch_results[custom_id]
+            ok = is_well_formed(result)
+            if ok and cache is not None:
+                cache.put(cache_keys[idx], *result)
+        else:
+            if batch.status == "completed":
+                reporter.error(f"Batch request {custom_id} failed: {batch_errors.get(custom_id, 'no output returned')}")
+            result, ok = API_ERROR_RESULT, False
+        results[idx] = result
+        done_count += 1
+        if on_complete:
+            on_complete(idx, done_count, result, ok)
+
+    _report_usage(calls_usage, usage, reporter, metrics, errors=len(missing))
+    return results
+
+
+def _report_usage(calls_usage, usage, reporter, metrics, errors=0):
+    """Adds a batch's calls to the caller's totals, or reports them here if there are none."""
+    if metrics is not None:
+        metrics.add_calls(calls_usage, errors=errors)
+    if usage is not None:
+        usage.merge(calls_usage)
+    else:
+        reporter.info(format_usage_report(calls_usage.summary()))
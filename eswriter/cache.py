@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from .config import CACHE_MAX_AGE_DAYS, CACHE_MAX_BYTES, CACHE_PATH
+
+
+class SummaryCache:
+    """
+    SQLite-backed cache of parsed (English, Arabic) summaries, keyed on a hash of the full prompt messages,
+    the deployment name and the sampling parameters. Entries older than max_age_days are dropped,
+    and the least recently used entries are evicted once the stored text exceeds max_bytes.
+    """
+
+    # Evict after this many writes, rather than on every one.
+    EVICT_EVERY = 50
+
+    def __init__(self, path=CACHE_PATH, max_age_days=CACHE_MAX_AGE_DAYS, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                english TEXT NOT NULL,
+                arabic TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(messages, deployment_name, params):
+        payload = json.dumps({"messages": messages, "deployment": deployment_name, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached (english, arabic) pair, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT english, arabic, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None or self._is_expired(row[2]):
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return row[0], row[1]
+
+    def put(self, key, english, arabic):
+        now = time.time()
+        size_bytes = len(english.encode("utf-8")) + len(arabic.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, english, arabic, size_bytes, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, english, arabic, size_bytes, now, now),
+            )
+            self._conn.commit()
+            self.stats["writes"] += 1
+            self._writes_since_evict += 1
+            evict_now = self._writes_since_evict >= self.EVICT_EVERY
+        if evict_now:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until the cache fits in max_bytes."""
+        with self._lock:
+            self._writes_since_evict = 0
+            removed = 0
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (cutoff,)).rowcount
+
+            if self.max_bytes is not None:
+                total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM summaries").fetchone()[0]
+                if total > self.max_bytes:
+                    stale_keys = []
+                    for key, size_bytes in self._conn.execute("SELECT key, size_bytes FROM summaries ORDER BY accessed_at"):
+                        if total <= self.max_bytes:
+                            break
+                        stale_keys.append((key,))
+                        total -= size_bytes
+                    self._conn.executemany("DELETE FROM summaries WHERE key = ?", stale_keys)
+                    removed += len(stale_keys)
+
+            self._conn.commit()
+            self.stats["evictions"] += removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.commit()
+
+    def entry_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def _is_expired(self, created_at):
+        return self.max_age_days is not None and created_at < time.time() - self.max_age_days * 86400
+
+
+@lru_cache(maxsize=None)
+def get_summary_cache(path=CACHE_PATH):
+    """Process-wide SummaryCache for the given path, shared by every run in this process."""
+    return SummaryCache(path)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+
+from .config import JOURNAL_DIR
+
+SCORES_STAGE = "scores"
+COMMENTS_STAGE = "comments"
+# Single-call score summary plus comment paragraph, see pipeline.process_scores_with_comments.
+FUSED_STAGE = "fused"
+
+
+def journal_path_for(*inputs, directory=JOURNAL_DIR):
+    """Journal path derived from the bytes of the run's input files, so re-uploading the same files resumes the same run."""
+    digest = hashlib.sha256()
+    for data in inputs:
+        digest.update(hashlib.sha256(data).digest())
+    return os.path.join(directory, f"{digest.hexdigest()[:16]}.jsonl")
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL record of the people finished in a run. Each line holds the stage, the person,
+    a hash of the prompt that was sent and the resulting summaries. A restarted run only regenerates
+    people with no entry, or whose prompt has changed since the entry was written. Submitted Batch API
+    jobs are journaled too, so an interrupted batch run resumes polling instead of resubmitting; a
+    job that ended without completing is dropped again, so the next run submits a new one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A partially written last line from an interrupted run.
+                    continue
+                if "batch_id" in entry:
+                    self._batches[(entry["stage"], entry["requests_hash"])] = entry["batch_id"]
+                else:
+                    self._entries[(entry["stage"], entry["person"])] = entry
+
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, stage, person, prompt):
+        """Returns the journaled (english, arabic) pair for this person and prompt, or None."""
+        entry = self._entries.get((stage, str(person)))
+        if entry is None or entry["prompt_hash"] != self.prompt_hash(prompt):
+            return None
+        return entry["english"], entry["arabic"]
+
+    def record(self, stage, person, prompt, english, arabic):
+        entry = {
+            "stage": stage,
+            "person": str(person),
+            "prompt_hash": self.prompt_hash(prompt),
+            "english": english,
+            "arabic": arabic,
+        }
+        with self._lock:
+            self._append(entry)
+            self._entries[(stage, entry["person"])] = entry
+
+    def pending_batch(self, stage, requests_hash):
+        """The Batch API job already submitted for this exact set of requests, or None."""
+        return self._batches.get((stage, requests_hash))
+
+    def record_batch(self, stage, requests_hash, batch_id):
+        with self._lock:
+            self._append({"stage": stage, "requests_hash": requests_hash, "batch_id": batch_id})
+            self._batches[(stage, requests_hash)] = batch_id
+
+    def drop_batch(self, stage, requests_hash):
+        """Forgets the journaled Batch API job for these requests, e.g. once it has expired or failed."""
+        self.record_batch(stage, requests_hash, None)
+
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        return len(self._entries)
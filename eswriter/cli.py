@@ -0,0 +1,170 @@
+"""
+Headless entry point for the summary pipeline:
+
+    python -m eswriter run scores.xlsx --comments comments.xlsx -o out.xlsx
+
+With --comments, people who have comments get a single call returning both the score summary and
+the comment paragraph; --two-stage sends the comments in a second call per person instead.
+Responses that fail validation are repaired with a short follow-up call where possible; rows that
+still fail can be regenerated on their own with --retry-failed, which rewrites the existing output.
+After correcting a few rows of the scores or comments file, --incremental compares it with the
+input fingerprints stored in the existing output and only regenerates people whose inputs changed.
+
+Credentials come from the AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_API_KEY / AZURE_OPENAI_DEPLOYMENT
+environment variables or from .streamlit/secrets.toml. Every finished person is written to a
+checkpoint journal next to the output file, so re-running the same command after a crash or
+Ctrl-C only generates the people that are still missing. --metrics writes per-stage timings,
+call latency percentiles, token throughput and retry counts to a JSON file.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import pandas as pd
+
+from .checkpoint import CheckpointJournal
+from .config import BATCH_POLL_INTERVAL, CACHE_MODES, DEFAULT_MAX_CONCURRENCY, EXECUTION_MODES, SECRETS_PATH, load_settings
+from .excel import df_to_excel_bytes
+from .metrics import RunMetrics
+from .pipeline import process_comments_and_append, process_scores, process_scores_with_comments, regenerate_changed, retry_failed_rows
+from .progress import ProgressReporter
+from .tokens import compare_score_prompt_tokens
+from .usage import UsageTracker, format_usage_report
+from .validation import find_failed_rows
+
+
+class ConsoleReporter(ProgressReporter):
+    """Prints pipeline progress to stderr."""
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def start(self, total):
+        if not self.quiet:
+            print(f"{total} request(s) to send", file=sys.stderr)
+
+    def advance(self, done, total, message):
+        if not self.quiet:
+            print(f"[{done}/{total}] {message}", file=sys.stderr)
+
+    def info(self, message):
+        print(message, file=sys.stderr)
+
+    def error(self, message):
+        print(f"ERROR: {message}", file=sys.stderr)
+
+
+def run(args):
+    try:
+        settings = load_settings(args.secrets)
+    except KeyError as e:
+        print(f"Missing Azure OpenAI setting {e}: set it in {args.secrets} or the matching AZURE_OPENAI_* environment variable.", file=sys.stderr)
+        return 2
+
+    journal_path = args.journal or f"{args.output}.journal.jsonl"
+    if not args.resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal = CheckpointJournal(journal_path)
+    reporter = ConsoleReporter(quiet=args.quiet)
+    metrics = RunMetrics()
+    # One usage report for the whole command, even when it runs several pipeline steps.
+    usage = UsageTracker()
+
+    run_options = {
+        "max_workers": args.concurrency,
+        "cache_mode": args.cache,
+        "execution_mode": args.mode,
+        "batch_poll_interval": args.poll_interval,
+        "stream": args.stream,
+        "metrics": metrics,
+        "usage": usage,
+    }
+
+    with metrics.timer("read_excel"):
+        scores_df = pd.read_excel(args.scores, engine='openpyxl')
+        comments_df = pd.read_excel(args.comments, engine='openpyxl') if args.comments else None
+    if args.retry_failed:
+        if not os.path.exists(args.output):
+            print(f"--retry-failed needs the output of an earlier run, but {args.output} does not exist.", file=sys.stderr)
+            return 2
+        previous_df = pd.read_excel(args.output, engine='openpyxl')
+        results_df = retry_failed_rows(
+            previous_df, scores_df, settings, comments_df=comments_df, fused=not args.two_stage,
+            journal=journal, reporter=reporter, compact=args.compact, **run_options,
+        )
+    elif args.incremental and os.path.exists(args.output):
+        previous_df = pd.read_excel(args.output, engine='openpyxl')
+        results_df = regenerate_changed(
+            previous_df, scores_df, settings, comments_df=comments_df, fused=not args.two_stage,
+            journal=journal, reporter=reporter, compact=args.compact, **run_options,
+        )
+    elif comments_df is not None and not args.two_stage:
+        results_df = process_scores_with_comments(scores_df, comments_df, settings, journal=journal, reporter=reporter, compact=args.compact, **run_options)
+    else:
+        results_df = process_scores(scores_df, settings, journal=journal, reporter=reporter, compact=args.compact, **run_options)
+        if comments_df is not None:
+            results_df = process_comments_and_append(results_df, comments_df, settings, journal=journal, reporter=reporter, **run_options)
+
+    with metrics.timer("export_xlsx"):
+        with open(args.output, "wb") as f:
+            f.write(df_to_excel_bytes(results_df))
+    reporter.info(format_usage_report(usage.summary()))
+    print(f"Wrote {len(results_df)} summaries to {args.output}", file=sys.stderr)
+    with metrics.timer("validate_rows"):
+        failed = int(find_failed_rows(results_df).sum())
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.to_json())
+        print(f"Wrote run metrics to {args.metrics}", file=sys.stderr)
+    if failed:
+        print(f"{failed} row(s) failed validation; re-run with --retry-failed to regenerate only those.", file=sys.stderr)
+    return 0
+
+
+def tokens(args):
+    scores_df = pd.read_excel(args.scores, engine='openpyxl')
+    report = compare_score_prompt_tokens(scores_df)
+    method = "tiktoken" if report["exact"] else "estimated at 4 characters per token"
+    print(f"Score prompt input tokens for {report['people']} people ({method}):")
+    print(f"{'layout':<10} {'template':>10} {'per person':>12} {'per request':>12}")
+    for layout in ("full", "compact"):
+        row = report[layout]
+        print(f"{layout:<10} {row['template_tokens']:>10} {row['person_tokens']:>12.0f} {row['request_tokens']:>12.0f}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="eswriter", description="Generate bilingual performance summaries from assessment scores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Generate summaries for a scores file, optionally enriched with comments.")
+    run_parser.add_argument("scores", help="Scores workbook (.xlsx) in the template layout.")
+    run_parser.add_argument("--comments", help="Optional comments workbook with 'Person Code' and 'Comments' columns.")
+    run_parser.add_argument("--two-stage", action="store_true", help="Summarize comments in a second call per person instead of one fused call.")
+    run_parser.add_argument("--retry-failed", action="store_true", help="Only regenerate the rows of the existing output that fail validation.")
+    run_parser.add_argument("--incremental", action="store_true", help="Reuse rows of the existing output whose inputs are unchanged; regenerate the rest.")
+    run_parser.add_argument("-o", "--output", required=True, help="Where to write the resulting workbook.")
+    run_parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="Maximum concurrent API calls.")
+    run_parser.add_argument("--cache", choices=list(CACHE_MODES), default="use", help="Response cache mode.")
+    run_parser.add_argument("--mode", choices=list(EXECUTION_MODES), default="interactive", help="Interactive calls or one Batch API job per stage. Requests that fail in a batch are left failed, not re-sent interactively.")
+    run_parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL, help="Seconds between Batch API status checks.")
+    run_parser.add_argument("--stream", action="store_true", help="Stream responses, reporting time to first token.")
+    run_parser.add_argument("--metrics", help="Write stage timings, call latencies and retry counts to this JSON file.")
+    run_parser.add_argument("--journal", help="Checkpoint journal path (default: <output>.journal.jsonl).")
+    run_parser.add_argument("--no-resume", dest="resume", action="store_false", help="Discard any existing checkpoint journal and start over.")
+    run_parser.add_argument("--secrets", default=SECRETS_PATH, help="Streamlit secrets file to read credentials from.")
+    run_parser.add_argument("--full-prompts", dest="compact", action="store_false", help="Send full indicator text per person instead of precomputed JSON payloads.")
+    run_parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors and the final summary.")
+    run_parser.set_defaults(func=run)
+
+    tokens_parser = subparsers.add_parser("tokens", help="Compare score prompt token counts for the full and compact layouts.")
+    tokens_parser.add_argument("scores", help="Scores workbook (.xlsx) in the template layout.")
+    tokens_parser.set_defaults(func=tokens)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,104 @@
+import os
+import tomllib
+
+# Upper bound on simultaneous Azure OpenAI requests during a batch run.
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Retry policy for throttled or transiently failing Azure OpenAI calls.
+MAX_RETRIES = 6
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Stop growing concurrency once the deployment reports fewer tokens than this left in the current window.
+REMAINING_TOKENS_HEADROOM = 4000
+
+# A common API version is used here. You might need to update it based on your Azure setup.
+AZURE_API_VERSION = "2024-02-01"
+
+# The Batch API needs a newer API version than interactive calls.
+AZURE_BATCH_API_VERSION = "2024-10-21"
+
+# Streamed calls ask for token usage in the final chunk (stream_options), which needs this API version.
+AZURE_STREAM_API_VERSION = "2024-10-21"
+# Seconds between live-preview refreshes while streamed responses arrive.
+STREAM_PREVIEW_INTERVAL = 0.5
+
+# Execution modes for a generation stage. Batch jobs are billed at a discount but may take up to the completion window.
+EXECUTION_MODES = {
+    "interactive": "Interactive (one call per person)",
+    "batch": "Batch API (cheaper, may take hours)",
+}
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 60.0
+
+# Sampling parameters for every summary request. They are part of the cache key.
+GENERATION_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 1000, # Increased to ensure enough space for both languages
+    "top_p": 0.95,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+}
+# Fused responses hold both summaries and both comment paragraphs, plus the JSON around them.
+FUSED_MAX_TOKENS = 2000
+
+# English word limits checked on every response, excluding the mandatory opening. Fused responses hold both.
+MAIN_SUMMARY_MAX_WORDS = 400
+COMMENT_SUMMARY_MAX_WORDS = 50
+
+# USD per 1M tokens, used for the end-of-run cost estimate. Update to match your deployment's pricing.
+TOKEN_PRICES = {
+    "input": 2.50,
+    "cached_input": 1.25,
+    "output": 10.00,
+}
+
+# On-disk cache of generated summaries, so re-running a cohort does not re-bill unchanged prompts.
+CACHE_PATH = os.path.join(".cache", "llm_summaries.sqlite3")
+CACHE_MAX_AGE_DAYS = 30
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+CACHE_MODES = {
+    "use": "Use cached summaries",
+    "refresh": "Refresh (regenerate and overwrite cache)",
+    "bypass": "Bypass (don't read or write cache)",
+}
+
+# Per-run checkpoint journals used to resume interrupted runs.
+JOURNAL_DIR = os.path.join(".cache", "runs")
+
+# Same keys as .streamlit/secrets.toml, so the CLI and the app can share one configuration.
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+SECRET_ENV_VARS = {
+    "azure_endpoint": "AZURE_OPENAI_ENDPOINT",
+    "azure_api_key": "AZURE_OPENAI_API_KEY",
+    "azure_deployment_name": "AZURE_OPENAI_DEPLOYMENT",
+    "azure_batch_deployment_name": "AZURE_OPENAI_BATCH_DEPLOYMENT",
+}
+
+
+def settings_from_secrets(secrets):
+    """
+    Builds the Azure settings dict from a secrets mapping. Raises KeyError if a required key is missing.
+    azure_batch_deployment_name is optional and defaults to the interactive deployment.
+    """
+    return {
+        "azure_endpoint": secrets["azure_endpoint"],
+        "api_key": secrets["azure_api_key"],
+        "deployment_name": secrets["azure_deployment_name"],
+        "batch_deployment_name": secrets.get("azure_batch_deployment_name") or secrets["azure_deployment_name"],
+    }
+
+
+def load_settings(secrets_path=SECRETS_PATH):
+    """
+    Loads Azure settings for headless runs. Environment variables take precedence over the
+    Streamlit secrets file. Raises KeyError if a value is missing from both.
+    """
+    secrets = {}
+    if secrets_path and os.path.exists(secrets_path):
+        with open(secrets_path, "rb") as f:
+            secrets.update(tomllib.load(f))
+    for key, env_var in SECRET_ENV_VARS.items():
+        if os.environ.get(env_var):
+            secrets[key] = os.environ[env_var]
+    return settings_from_secrets(secrets)
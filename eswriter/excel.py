@@ -0,0 +1,81 @@
+import hashlib
+import io
+
+import pandas as pd
+
+
+def get_sample_scores_df():
+    """Creates a sample DataFrame for the scores file."""
+    data = {
+        'Person': ['Indicator Text', 'EO1'],
+        'Adaptability': ['Adaptability', 4],
+        'Adaptability 1': ["Effectively navigates and leads teams through changes, minimizing disruption and maintaining morale.", 4],
+        'Adaptability 2': ["Quickly learns from experiences and applies insights to new situations, demonstrating a commitment to continuous improvement.", 4],
+        'Adaptability 3': ["Welcomes diverse perspectives and ideas, encouraging creative problem-solving and innovation.", 4],
+        'Adaptability 4': ["Displays personal resilience, remains calm and effective in times of crisis and ambiguity.", 4],
+        'Capability Development': ['Capability Development', 3],
+        'Capability Development 1': ["Identifies current skills and competencies within the team and assesses gaps relative to future needs, informing targeted development initiatives.", 2.5],
+        'Capability Development 2': ["Engages in coaching to develop team members' skills, providing guidance and support.", 3.5],
+        'Capability Development 3': ["Delegates responsibilities effectively encouraging team members to take ownership of their work.", 3],
+        'Capability Development 4': ["Proactively identifies and nurtures high-potential team members, ensuring that the organization has the necessary talent to meet current and future challenges.", 3],
+        'Decision Making and Takes Accountability': ['Decision Making and Takes Accountability', 4.8],
+        'Decision Making and Takes Accountability 1': ["Show the ability to act assertively and take independent and tough decisions even when they are unpopular.", 4.5],
+        'Decision Making and Takes Accountability 2': ["Displays confidence and credibility in decision-making, skilfully articulating decisions to garner support and alignment from others.", 5],
+        'Decision Making and Takes Accountability 3': ["Identifies potential risks associated with tactical decisions and evaluates their implications on success of the overall goals.", 4.5],
+        'Decision Making and Takes Accountability 4': ["Utilizes critical thinking to assess options and make informed decisions that align with objectives and values.", 5],
+        'Effective Communication and Influence': ['Effective Communication and Influence', 3.5],
+        'Effective Communication and Influence 1': ["Clearly articulates ideas and information in ensuring understanding.", 4],
+        'Effective Communication and Influence 2': ["Seeks common ground and influences others towards win-win outcomes, facilitating agreement between different parties.", 4],
+        'Effective Communication and Influence 3': ["Demonstrates strong listening skills, ensuring that team members feel heard and understood.", 2.5],
+        'Effective Communication and Influence 4': ["Adjusts communication style and approach based on the audience and context, ensuring effective engagement with diverse groups.", 3.5],
+        'Initiative': ['Initiative', 3.8],
+        'Initiative 1': ["Takes the initiative to identify and pursue opportunities, demonstrating a willingness to act without being prompted.", 4],
+        'Initiative 2': ["Sets ambitious objectives and consistently seeks ways to exceed expectations, demonstrating a strong commitment to achieving results.", 4],
+        'Initiative 3': ["Displays grit in the achievement of challenging goals, pushing boundaries for self and others performance.", 3.5],
+        'Initiative 4': ["Consistently takes action beyond immediate responsibilities to achieve goals.", 3.5],
+        'Inspirational Leadership': ['Inspirational Leadership', 3.4],
+        'Inspirational Leadership 1': ["Develops a sense of common vision and purpose in one's team that drives activity and creates motivation to achieve overall goals.", 4],
+        'Inspirational Leadership 2': ["Collaborates and works with others effectively, demonstrating the ability to judge what is the most appropriate leadership style (e.g. directive, collaborative, etc.)", 3.5],
+        'Inspirational Leadership 3': ["Demonstrates awareness of one’s own emotions and those of others, is aware of his/her impact on others and uses this understanding to inspire others.", 3],
+        'Inspirational Leadership 4': ["Recognizes the individual styles of each team member and proactively manages them in ways that draw out their best contributions.", 3],
+        'Strategic Thinking': ['Strategic Thinking', 4],
+        'Strategic Thinking 1': ["Monitors and predicts key trends in the industry to inform the future direction of the organization.", 4],
+        'Strategic Thinking 2': ["Identifies and assesses potential disruptors and develops strategies to proactively navigate them.", 4],
+        'Strategic Thinking 3': ["Proactively identifies new opportunities that align with organizational goals and capabilities.", 4],
+        'Strategic Thinking 4': ["Translates complex strategic organizational goals into meaningful actions across teams and functions.", 4],
+        'Systematic Analysis and Planning': ['Systematic Analysis and Planning', 2.8],
+        'Systematic Analysis and Planning 1': ["Delivers high-quality results consistently, demonstrating effective project management skills.", 3],
+        'Systematic Analysis and Planning 2': ["Creates detailed action plans that outline the steps, resources, and timelines required to achieve strategic objectives, ensuring effective execution and accountability.", 3],
+        'Systematic Analysis and Planning 3': ["Effectively allocates resources (time, personnel, budget) to optimize project outcomes and align with strategic priorities.", 2.5],
+        'Systematic Analysis and Planning 4': ["Establishes metrics and benchmarks to evaluate progress and effectiveness of plans, making adjustments as necessary to achieve desired results.", 2.5]
+    }
+    return pd.DataFrame(data)
+
+def get_sample_comments_df():
+    """Creates a sample DataFrame for the comments file."""
+    data = {
+        'Person Code': ['EO1', 'EO1', 'E32', 'E32'],
+        'Comments': [
+            'He needs to be more vocal in leadership meetings.',
+            'His project planning documents are very detailed and helpful, but he sometimes misses the bigger picture on resource allocation.',
+            'A bit quiet, but very reliable once a task is assigned.',
+            'Would like to see him present his ideas with more confidence to senior stakeholders.'
+        ]
+    }
+    return pd.DataFrame(data)
+
+
+def df_to_excel_bytes(df):
+    """Converts a DataFrame to an in-memory Excel file (bytes)."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Sheet1')
+    output.seek(0)
+    return output.getvalue()
+
+
+def dataframe_hash(df):
+    """Content hash of a dataframe, so workbook bytes can be reused until the data actually changes."""
+    digest = hashlib.sha256("\x1f".join(str(column) for column in df.columns).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,403 @@
+"""
+A local stand-in for an Azure OpenAI chat completions deployment.
+
+It speaks just enough of the REST API for the AzureOpenAI client used by eswriter, and enforces
+a requests-per-minute quota the way Azure does: once the quota for the current window is used
+up, calls get a 429 with Retry-After. Random 429s can also be injected to exercise the retry
+and backoff path, and a fraction of replies can be cut short before the Arabic half to exercise
+response validation and repair. Prompt caching is imitated too: a repeated system message of 1,024+ tokens is
+reported back as cached prompt tokens. The files and batches endpoints of the Batch API are also
+served, completing each batch in the background after `batch_delay` seconds. Streamed requests
+(stream=True) are answered as server-sent events, `latency` seconds before the first chunk and
+`chunk_delay` seconds between chunks; a `stream_drop_rate` fraction of them is cut off after the
+first chunk. Point the app at it with:
+
+    azure_endpoint = "http://127.0.0.1:8765"
+    azure_api_key = "fake"
+    azure_deployment_name = "gpt-4o"
+
+Run it with `python -m eswriter.fake_azure_openai --rpm 60 --throttle-rate 0.1`.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Azure only caches prompts of at least this many tokens, in 128-token increments.
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+COMPLETIONS_PATH = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions")
+FILES_PATH = re.compile(r"^/openai/files(\?|$)")
+FILE_CONTENT_PATH = re.compile(r"^/openai/files/(?P<file_id>[^/?]+)/content")
+BATCHES_PATH = re.compile(r"^/openai/batches(\?|$)")
+BATCH_PATH = re.compile(r"^/openai/batches/(?P<batch_id>[^/?]+)")
+
+# Words of the reply sent per chunk of a streamed response.
+STREAM_WORDS_PER_CHUNK = 4
+
+DEFAULT_REPLY = (
+    "Your participation in the assessment center provided insight into how you demonstrate "
+    "the leadership competencies in action. The feedback below highlights observed strengths "
+    "and opportunities for development to support your continued growth.\n---ARABIC_SUMMARY---\n"
+    "نشكرك على مشاركتك في مركز التقييم."
+)
+# Answer to requests made in JSON mode (response_format json_object), shaped like a fused summary.
+DEFAULT_JSON_REPLY = json.dumps({
+    "english_summary": (
+        "Your participation in the assessment center provided insight into how you demonstrate the leadership competencies "
+        "in action. The feedback below highlights observed strengths and opportunities for development to support your continued growth."
+    ),
+    "arabic_summary": "نشكرك على مشاركتك في مركز التقييم.",
+    "english_comment_summary": "Additionally, feedback suggests he would benefit from increasing his visibility.",
+    "arabic_comment_summary": "بالإضافة إلى ذلك، تشير الملاحظات إلى أنه سيستفيد من زيادة حضوره.",
+}, ensure_ascii=False)
+
+
+def malformed_reply(reply, json_mode):
+    """The reply with its Arabic summary missing, as a model that ran out of tokens or forgot the delimiter would send it."""
+    if json_mode:
+        data = json.loads(reply)
+        data.pop("arabic_summary", None)
+        return json.dumps(data, ensure_ascii=False)
+    return reply.split("---ARABIC_SUMMARY---", 1)[0]
+
+
+class FakeAzureOpenAIServer(ThreadingHTTPServer):
+    """HTTP server holding the quota window and counters shared by all request handlers."""
+
+    daemon_threads = True
+
+    def __init__(self, address, rpm=None, throttle_rate=0.0, retry_after=1.0, latency=0.0, reply=DEFAULT_REPLY, json_reply=DEFAULT_JSON_REPLY,
+                 batch_delay=0.5, malformed_rate=0.0, chunk_delay=0.0, batch_status="completed", stream_drop_rate=0.0):
+        super().__init__(address, FakeAzureOpenAIHandler)
+        self.rpm = rpm
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.latency = latency
+        self.reply = reply
+        self.json_reply = json_reply
+        self.malformed_rate = malformed_rate
+        self.chunk_delay = chunk_delay
+        self.stream_drop_rate = stream_drop_rate
+        self.batch_delay = batch_delay
+        self.batch_status = batch_status
+        self.files = {}
+        self.batches = {}
+        self.window_seconds = 60.0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {"requests": 0, "completed": 0, "throttled": 0}
+        self.seen_prefixes = set()
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def cached_tokens(self, messages):
+        """Imitates prompt caching: the first message counts as cached once it has been seen before."""
+        if not messages:
+            return 0
+        prefix = str(messages[0].get("content", ""))
+        prefix_tokens = len(prefix) // 4
+        if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self.lock:
+            seen = digest in self.seen_prefixes
+            self.seen_prefixes.add(digest)
+        return prefix_tokens // PROMPT_CACHE_INCREMENT * PROMPT_CACHE_INCREMENT if seen else 0
+
+    def completion_body(self, deployment, messages, response_format=None):
+        """A chat.completion response for the given messages, with usage filled in."""
+        json_mode = (response_format or {}).get("type") == "json_object"
+        reply = self.json_reply if json_mode else self.reply
+        if self.malformed_rate and random.random() < self.malformed_rate:
+            reply = malformed_reply(reply, json_mode)
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        prompt_tokens = max(1, prompt_chars // 4)
+        completion_tokens = max(1, len(reply) // 4)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": reply},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": self.cached_tokens(messages)},
+            },
+        }
+
+    def store_file(self, filename, data, purpose):
+        file_id = f"file-{uuid.uuid4().hex}"
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = (record, data)
+        return record
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    def _run_batch(self, batch_id):
+        """
+        Answers every request line of a batch input file and stores the output file. With batch_status
+        set to another terminal status, the batch ends in that status without any output instead.
+        """
+        with self.lock:
+            batch = self.batches[batch_id]
+            _, data = self.files[batch["input_file_id"]]
+            lines = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+            batch.update(status="in_progress", in_progress_at=int(time.time()))
+            batch["request_counts"]["total"] = len(lines)
+
+        time.sleep(self.batch_delay)
+        if self.batch_status != "completed":
+            with self.lock:
+                batch.update(status=self.batch_status, **{f"{self.batch_status}_at": int(time.time())})
+            return
+        outputs = []
+        for line in lines:
+            body = line.get("body", {})
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": self.completion_body(body.get("model"), body.get("messages", []), body.get("response_format"))},
+                "error": None,
+            })
+        output = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in outputs).encode("utf-8")
+        output_file = self.store_file("output.jsonl", output, "batch_output")
+
+        with self.lock:
+            batch["request_counts"]["completed"] = len(outputs)
+            batch.update(status="completed", output_file_id=output_file["id"], completed_at=int(time.time()))
+
+    def admit(self):
+        """Returns (allowed, remaining_requests, retry_after_seconds) for one incoming request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if now - self.window_start >= self.window_seconds:
+                self.window_start = now
+                self.window_count = 0
+
+            if self.throttle_rate and random.random() < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return False, None, self.retry_after
+
+            if self.rpm is not None and self.window_count >= self.rpm:
+                self.stats["throttled"] += 1
+                return False, 0, max(0.0, self.window_seconds - (now - self.window_start))
+
+            self.window_count += 1
+            remaining = None if self.rpm is None else self.rpm - self.window_count
+            return True, remaining, None
+
+
+class FakeAzureOpenAIHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive, like the real endpoint, so client connection reuse can be observed.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, body, include_usage, headers=None):
+        """Sends a completion body as chat.completion.chunk server-sent events over chunked encoding."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+        content = body["choices"][0]["message"]["content"]
+        pieces = re.findall(r"\S+\s*", content)
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}]
+        for start in range(0, len(pieces), STREAM_WORDS_PER_CHUNK):
+            delta = "".join(pieces[start:start + STREAM_WORDS_PER_CHUNK])
+            events.append({**base, "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]})
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            events.append({**base, "choices": [], "usage": body["usage"]})
+
+        drop = self.server.stream_drop_rate and random.random() < self.server.stream_drop_rate
+        for position, event in enumerate(events):
+            if position > 1 and self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            if drop and position == 2:
+                # Hang up mid-stream, without the terminating chunk.
+                self.close_connection = True
+                return
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length)
+
+    def _send_not_found(self):
+        self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+
+    def do_GET(self):
+        server = self.server
+        content_match = FILE_CONTENT_PATH.match(self.path)
+        batch_match = BATCH_PATH.match(self.path)
+        if content_match and content_match.group("file_id") in server.files:
+            _, data = server.files[content_match.group("file_id")]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif batch_match and batch_match.group("batch_id") in server.batches:
+            with server.lock:
+                batch = json.loads(json.dumps(server.batches[batch_match.group("batch_id")]))
+            self._send_json(200, batch)
+        else:
+            self._send_not_found()
+
+    def do_POST(self):
+        body = self._read_body()
+        if FILES_PATH.match(self.path):
+            self._upload_file(body)
+        elif BATCHES_PATH.match(self.path):
+            request = json.loads(body or b"{}")
+            self._send_json(200, self.server.create_batch(request["input_file_id"], request["endpoint"], request["completion_window"]))
+        elif COMPLETIONS_PATH.match(self.path):
+            self._chat_completion(COMPLETIONS_PATH.match(self.path).group("deployment"), json.loads(body or b"{}"))
+        else:
+            self._send_not_found()
+
+    def _upload_file(self, body):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        filename, data = fields["file"]
+        purpose = fields.get("purpose", (None, b"batch"))[1].decode("utf-8")
+        self._send_json(200, self.server.store_file(filename or "upload.jsonl", data, purpose))
+
+    def _chat_completion(self, deployment, request):
+        server = self.server
+        allowed, remaining, retry_after = server.admit()
+        if not allowed:
+            headers = {"Retry-After": str(int(round(retry_after))), "retry-after-ms": str(int(retry_after * 1000))}
+            if remaining is not None:
+                headers["x-ratelimit-remaining-requests"] = str(remaining)
+            self._send_json(429, {"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}}, headers)
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        headers = {}
+        if remaining is not None:
+            headers["x-ratelimit-remaining-requests"] = str(remaining)
+        with server.lock:
+            server.stats["completed"] += 1
+        body = server.completion_body(deployment, request.get("messages", []), request.get("response_format"))
+        if request.get("stream"):
+            self._send_stream(body, (request.get("stream_options") or {}).get("include_usage"), headers)
+        else:
+            self._send_json(200, body, headers)
+
+
+def start_fake_server(host="127.0.0.1", port=0, **config):
+    """Starts the fake server on a background thread and returns it; call .shutdown() when done."""
+    server = FakeAzureOpenAIServer((host, port), **config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Azure OpenAI chat completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before returning 429s.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests to reject with 429 at random.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of replies sent without their Arabic summary.")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between chunks of a streamed response.")
+    parser.add_argument("--stream-drop-rate", type=float, default=0.0, help="Fraction of streamed responses cut off after the first chunk.")
+    parser.add_argument("--batch-delay", type=float, default=0.5, help="Seconds before a submitted batch completes.")
+    parser.add_argument("--batch-status", choices=["completed", "failed", "expired", "cancelled"], default="completed",
+                        help="Terminal status of submitted batches; anything but completed ends them without output.")
+    args = parser.parse_args()
+
+    server = FakeAzureOpenAIServer(
+        (args.host, args.port),
+        rpm=args.rpm,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        latency=args.latency,
+        batch_delay=args.batch_delay,
+        malformed_rate=args.malformed_rate,
+        chunk_delay=args.chunk_delay,
+        batch_status=args.batch_status,
+        stream_drop_rate=args.stream_drop_rate,
+    )
+    print(f"Fake Azure OpenAI endpoint listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
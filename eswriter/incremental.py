@@ -0,0 +1,82 @@
+"""
+Input fingerprints for incremental re-generation. Each result row carries a hash of everything
+that went into it: the person's score row, the shared header and indicator-definition rows and,
+once comments are added, the person's comment set. Comparing a new upload against the
+fingerprints of the previous results tells which people actually need regenerating.
+"""
+import hashlib
+import json
+
+import pandas as pd
+
+from .prompts import index_comments, normalize_person_code, select_people
+from .validation import STATUS_COLUMN
+
+FINGERPRINT_COLUMN = "Input Fingerprint"
+RESULT_COLUMNS = ["Person", "English Summary", "Arabic Summary", FINGERPRINT_COLUMN, STATUS_COLUMN]
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def score_fingerprints(df):
+    """Fingerprint of each person's score inputs, aligned with select_people(df)."""
+    shared = _digest([str(column) for column in df.columns], [str(value) for value in df.iloc[0]])
+    return [_digest(shared, [str(value) for value in row]) for row in select_people(df).itertuples(index=False)]
+
+
+def with_comments_fingerprint(score_fingerprint, person_comments):
+    """Extends a score fingerprint with the person's comment set; people without comments get an empty set."""
+    return _digest(score_fingerprint, [str(comment) for comment in person_comments or []])
+
+
+def input_fingerprints(scores_df, comments_df=None):
+    """
+    {normalised person code: (person name, fingerprint)} for an upload, computed the same way as the
+    fingerprints stored on results, with comments included when comments_df is given.
+    """
+    comments_by_person = index_comments(comments_df) if comments_df is not None else None
+    fingerprints = {}
+    for person_name, fingerprint in zip(select_people(scores_df).iloc[:, 0], score_fingerprints(scores_df)):
+        code = normalize_person_code(person_name)
+        if comments_by_person is not None:
+            fingerprint = with_comments_fingerprint(fingerprint, comments_by_person.get(code))
+        fingerprints[code] = (person_name, fingerprint)
+    return fingerprints
+
+
+def diff_inputs(previous_df, scores_df, comments_df=None):
+    """
+    Compares an upload against the fingerprints stored on previous results. Returns a dict of person
+    name lists: "new", "changed" and "unchanged" in upload order, then "removed" for people that are
+    only in the previous results. Previous results without fingerprints count as changed; failed
+    rows are stored without one, so they are regenerated too.
+    """
+    previous = {}
+    if previous_df is not None and FINGERPRINT_COLUMN in previous_df:
+        for person, fingerprint in zip(previous_df['Person'], previous_df[FINGERPRINT_COLUMN]):
+            previous[normalize_person_code(person)] = None if pd.isna(fingerprint) else fingerprint
+    elif previous_df is not None:
+        previous = {normalize_person_code(person): None for person in previous_df['Person']}
+
+    current = input_fingerprints(scores_df, comments_df)
+    diff = {"new": [], "changed": [], "unchanged": [], "removed": []}
+    for code, (person_name, fingerprint) in current.items():
+        if code not in previous:
+            diff["new"].append(person_name)
+        elif previous[code] != fingerprint:
+            diff["changed"].append(person_name)
+        else:
+            diff["unchanged"].append(person_name)
+    if previous_df is not None:
+        diff["removed"] = [person for person in previous_df['Person'] if normalize_person_code(person) not in current]
+    return diff
+
+
+def format_diff(diff):
+    """One-line changed/unchanged/removed summary of a diff_inputs result."""
+    return (
+        f"{len(diff['changed'])} changed, {len(diff['new'])} new, {len(diff['unchanged'])} unchanged, "
+        f"{len(diff['removed'])} removed."
+    )
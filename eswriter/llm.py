@@ -0,0 +1,479 @@
+import asyncio
+import importlib.util
+import json
+import random
+import threading
+import time
+import weakref
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI, APIConnectionError, APIError, APIStatusError
+
+from .cache import SummaryCache
+from .config import (
+    AZURE_API_VERSION,
+    AZURE_STREAM_API_VERSION,
+    DEFAULT_MAX_CONCURRENCY,
+    FUSED_MAX_TOKENS,
+    GENERATION_PARAMS,
+    MAX_RETRIES,
+    REMAINING_TOKENS_HEADROOM,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRYABLE_STATUS_CODES,
+)
+from .prompts import FUSED_RESPONSE_FIELDS
+
+SUMMARY_DELIMITER = '---ARABIC_SUMMARY---'
+MISSING_ARABIC_MESSAGE = "Arabic summary could not be parsed. Delimiter '---ARABIC_SUMMARY---' not found."
+API_ERROR_RESULT = ("Error: API call failed.", "Error: API call failed.")
+# A response cut off at max_tokens, or a fused response that is not valid JSON. Re-sent in full, like an API error.
+INCOMPLETE_RESPONSE_MESSAGE = "Error: response was cut off or malformed."
+INCOMPLETE_RESPONSE_RESULT = (INCOMPLETE_RESPONSE_MESSAGE, INCOMPLETE_RESPONSE_MESSAGE)
+# Stands in for the comment paragraph of a fused response that wrote it in one language only.
+UNPAIRED_COMMENT_MESSAGE = "Error: comment paragraph missing in this language."
+# Fused requests ask for JSON mode; it is part of their cache key and Batch API request body.
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# A streamed response once fully read: its text, finish reason, the usage chunk and seconds to the first content token.
+StreamedCompletion = namedtuple("StreamedCompletion", ["content", "finish_reason", "usage", "time_to_first_token"])
+
+# Shared HTTP connection pool for all Azure OpenAI calls. HTTP/2 is used when the h2 package is installed.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=120.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+def _header_number(headers, name):
+    """Reads a numeric response header, returning None if it is missing or malformed."""
+    value = headers.get(name) if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_retry_after(headers):
+    """Returns the server-requested wait in seconds from retry-after-ms / Retry-After headers, or None."""
+    retry_after_ms = _header_number(headers, "retry-after-ms")
+    if retry_after_ms is not None:
+        return max(0.0, retry_after_ms / 1000.0)
+
+    value = headers.get("retry-after") if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        # Retry-After may also be an HTTP date.
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    Shares Azure OpenAI rate-limit state between the worker threads of a batch run.
+    The number of requests in flight follows AIMD: it grows by roughly one per window of
+    successful calls and halves once per congestion event. A burst of 429s for requests that were
+    all in flight together counts as one event, since they all reflect the same exhausted window.
+    A Retry-After from the server pauses all workers, and growth stops while the
+    x-ratelimit-remaining-* headers say the quota is nearly spent.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = float("-inf")
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent under the current concurrency limit and pause. Returns
+        the time.monotonic() at which the slot was granted, for on_throttle.
+        """
+        with self._cond:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+            self.stats["requests"] += 1
+            return time.monotonic()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, headers):
+        """Additive increase, unless the deployment reports it is close to its RPM/TPM quota."""
+        remaining_requests = _header_number(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_number(headers, "x-ratelimit-remaining-tokens")
+        with self._cond:
+            near_quota = (
+                (remaining_requests is not None and remaining_requests <= self.in_flight)
+                or (remaining_tokens is not None and remaining_tokens < REMAINING_TOKENS_HEADROOM)
+            )
+            if not near_quota:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after=None, sent_at=None):
+        """
+        Multiplicative decrease, and a shared pause if the server sent Retry-After. A request sent
+        (see acquire) before the last decrease was already accounted for by it and does not halve
+        the limit again.
+        """
+        with self._cond:
+            self.stats["throttled"] += 1
+            if sent_at is None or sent_at >= self.last_decrease:
+                self.limit = max(1.0, self.limit / 2.0)
+                self.last_decrease = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based), with jitter to avoid lockstep retries."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def record(self, key):
+        with self._cond:
+            self.stats[key] += 1
+
+
+def create_completion_with_retries(client, scheduler, read=None, **request_kwargs):
+    """
+    Sends a chat completion request through the scheduler, retrying throttled (429),
+    transient server errors and connection failures with jittered backoff. For streamed requests,
+    read(stream, sent_at) consumes the stream while the request still holds its scheduler slot.
+    The stream passes raw httpx transport errors and error events through as they happen, so a
+    connection dropped mid-stream is caught here and the whole request is retried.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        stream = None
+        acquired_at = scheduler.acquire()
+        try:
+            sent_at = time.perf_counter()
+            raw_response = client.chat.completions.with_raw_response.create(**request_kwargs)
+            scheduler.on_success(raw_response.headers)
+            completion = raw_response.parse()
+            if read is None:
+                return completion
+            stream = completion
+            return read(stream, sent_at)
+        except APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                scheduler.record("failures")
+                raise
+            retry_after = parse_retry_after(e.response.headers)
+            if e.status_code == 429:
+                scheduler.on_throttle(retry_after, sent_at=acquired_at)
+        except (APIConnectionError, httpx.TransportError):
+            if attempt == MAX_RETRIES:
+                scheduler.record("failures")
+                raise
+        except APIError:
+            # An error event in the middle of a stream; anything else is not transient.
+            if stream is None or attempt == MAX_RETRIES:
+                scheduler.record("failures")
+                raise
+        finally:
+            if stream is not None:
+                stream.close()
+            scheduler.release()
+
+        scheduler.record("retries")
+        time.sleep(scheduler.backoff_delay(attempt, retry_after))
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened TCP connections on the shared HTTP pool, using httpcore's
+    trace extension, so connection reuse can be checked from the UI.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.http2_requests = 0
+        self._lock = threading.Lock()
+
+    def _record(self, event_name):
+        with self._lock:
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections += 1
+            elif event_name == "http2.send_request_headers.started":
+                self.http2_requests += 1
+
+    def _sync_trace(self, event_name, info):
+        self._record(event_name)
+
+    async def _async_trace(self, event_name, info):
+        self._record(event_name)
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._sync_trace
+
+    async def on_async_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._async_trace
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused": max(0, self.requests - self.new_connections),
+                "http2_requests": self.http2_requests,
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+@lru_cache(maxsize=None)
+def get_azure_client(azure_endpoint, api_key, api_version=AZURE_API_VERSION):
+    """Process-wide AzureOpenAI client on a shared keep-alive connection pool."""
+    http_client = httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=HTTP_POOL_LIMITS,
+        timeout=HTTP_TIMEOUT,
+        event_hooks={"request": [connection_stats.on_request]},
+    )
+    return AzureOpenAI(
+        azure_endpoint=azure_endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        max_retries=0, # Retries are handled by the RateLimitScheduler
+        http_client=http_client,
+    )
+
+
+# Async connections belong to the event loop that opened them, so one async client is kept per loop.
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def get_async_azure_client(azure_endpoint, api_key, api_version=AZURE_API_VERSION):
+    """AsyncAzureOpenAI client on a shared connection pool for the running event loop."""
+    loop = asyncio.get_running_loop()
+    key = (azure_endpoint, api_key, api_version)
+    with _async_clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        if key not in clients:
+            http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=HTTP_POOL_LIMITS,
+                timeout=HTTP_TIMEOUT,
+                event_hooks={"request": [connection_stats.on_async_request]},
+            )
+            clients[key] = AsyncAzureOpenAI(
+                azure_endpoint=azure_endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                max_retries=0, # Retries are handled by the RateLimitScheduler
+                http_client=http_client,
+            )
+        return clients[key]
+
+
+def split_bilingual_response(full_response_text):
+    """Splits a model response into (english, arabic). Returns None for arabic if the delimiter is missing."""
+    if SUMMARY_DELIMITER in full_response_text:
+        eng_summary, ar_summary = full_response_text.split(SUMMARY_DELIMITER, 1)
+        return eng_summary.strip(), ar_summary.strip()
+    return full_response_text.strip(), None
+
+
+def parse_fused_response(full_response_text):
+    """
+    Reads a fused JSON response into (english, arabic), each the score summary followed by the
+    comment paragraph, if any. Returns None for arabic if the Arabic summary is missing, keeping the
+    English comment paragraph so the Arabic repair translates both. A comment paragraph written in
+    one language only is replaced by UNPAIRED_COMMENT_MESSAGE in the other. Returns
+    INCOMPLETE_RESPONSE_RESULT if the JSON is invalid or has no English summary, since there is
+    nothing to repair then.
+    """
+    try:
+        data = json.loads(full_response_text)
+        english, arabic, eng_comment, ar_comment = (str(data.get(field) or "").strip() for field in FUSED_RESPONSE_FIELDS)
+    except (json.JSONDecodeError, AttributeError):
+        return INCOMPLETE_RESPONSE_RESULT
+    if not english:
+        return INCOMPLETE_RESPONSE_RESULT
+    if eng_comment:
+        english += f"\n\n{eng_comment}"
+    if not arabic:
+        return english, None
+    if ar_comment:
+        arabic += f"\n\n{ar_comment}"
+    if eng_comment and not ar_comment:
+        arabic += f"\n\n{UNPAIRED_COMMENT_MESSAGE}"
+    elif ar_comment and not eng_comment:
+        english += f"\n\n{UNPAIRED_COMMENT_MESSAGE}"
+    return english, arabic
+
+
+def parse_response(full_response_text, structured=False, finish_reason=None):
+    """
+    (english, arabic) from a delimited response, or from a fused JSON one if structured is set.
+    A response that stopped at max_tokens is INCOMPLETE_RESPONSE_RESULT, however it parses.
+    """
+    if finish_reason == "length":
+        return INCOMPLETE_RESPONSE_RESULT
+    if structured:
+        return parse_fused_response(full_response_text or "")
+    return split_bilingual_response(full_response_text or "")
+
+
+def is_well_formed(result):
+    """Whether a parsed (english, arabic) result is a complete response, worth caching and journaling."""
+    return (
+        result[1] != MISSING_ARABIC_MESSAGE
+        and result != INCOMPLETE_RESPONSE_RESULT
+        and not any(UNPAIRED_COMMENT_MESSAGE in text for text in result)
+    )
+
+
+def request_params(structured=False):
+    """
+    Generation parameters for a request. Structured (fused) requests use JSON mode and a larger
+    max_tokens, since one response holds both summaries and both comment paragraphs.
+    """
+    if structured:
+        return {**GENERATION_PARAMS, "max_tokens": FUSED_MAX_TOKENS, "response_format": JSON_RESPONSE_FORMAT}
+    return GENERATION_PARAMS
+
+
+def read_stream(stream, sent_at, on_delta=None):
+    """
+    Reads a streamed chat completion into a StreamedCompletion. on_delta(text so far, seconds to
+    first token) is called from the worker thread after every content chunk.
+    """
+    parts = []
+    usage = None
+    finish_reason = None
+    time_to_first_token = None
+    for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].finish_reason:
+            finish_reason = chunk.choices[0].finish_reason
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - sent_at
+        parts.append(delta)
+        if on_delta:
+            on_delta("".join(parts), time_to_first_token)
+    return StreamedCompletion("".join(parts), finish_reason, usage, time_to_first_token)
+
+
+def build_messages(request):
+    """
+    Chat messages for a (system_prompt, user_content) request. The static instructions go first as
+    the system message so every call in a cohort shares the same prefix, which lets Azure OpenAI's
+    automatic prompt caching reuse it.
+    """
+    system_prompt, user_content = request
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def request_summary(request, settings, scheduler=None, cache=None, refresh_cache=False, usage=None, structured=False,
+                    stream=False, on_delta=None):
+    """
+    Makes the Azure OpenAI call for one (system_prompt, user_content) request and returns
+    (english, arabic). With structured set, the call uses JSON mode and the response is read as a
+    fused summary (see parse_fused_response). With stream set, the response is streamed and
+    on_delta(text so far, seconds to first token) is called as it arrives. API errors propagate to
+    the caller. Throttled calls are retried through the given RateLimitScheduler (a private one is
+    used if omitted). If a SummaryCache is given, a cached summary for the same messages,
+    deployment and sampling parameters is returned without calling the API, unless refresh_cache
+    is set. Token usage and latency are recorded on `usage` if given.
+    """
+    deployment_name = settings["deployment_name"]
+    message_text = build_messages(request)
+    params = request_params(structured)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = SummaryCache.make_key(message_text, deployment_name, params)
+        if not refresh_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                if usage is not None:
+                    usage.record_cache_hit()
+                return cached
+
+    # Reuse the pooled AzureOpenAI client
+    api_version = AZURE_STREAM_API_VERSION if stream else AZURE_API_VERSION
+    client = get_azure_client(settings["azure_endpoint"], settings["api_key"], api_version)
+    scheduler = scheduler or RateLimitScheduler(max_concurrency=1)
+
+    # Make the API call
+    started = time.perf_counter()
+    if stream:
+        completion = create_completion_with_retries(
+            client,
+            scheduler,
+            read=lambda response, sent_at: read_stream(response, sent_at, on_delta),
+            model=deployment_name,
+            messages=message_text,
+            stop=None,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params
+        )
+        content, finish_reason, completion_usage, time_to_first_token = completion
+    else:
+        completion = create_completion_with_retries(
+            client,
+            scheduler,
+            model=deployment_name,
+            messages=message_text,
+            stop=None,
+            **params
+        )
+        choice = completion.choices[0]
+        content, finish_reason = choice.message.content, choice.finish_reason
+        completion_usage, time_to_first_token = completion.usage, None
+    if usage is not None:
+        usage.record(completion_usage, time.perf_counter() - started, time_to_first_token)
+
+    # Parse the response and split English and Arabic summaries
+    eng_summary, ar_summary = parse_response(content, structured, finish_reason)
+    result = (eng_summary, ar_summary if ar_summary is not None else MISSING_ARABIC_MESSAGE)
+
+    # Only well-formed responses are cached, so a malformed one is regenerated next time.
+    if cache_key is not None and is_well_formed(result):
+        cache.put(cache_key, *result)
+    return result
+
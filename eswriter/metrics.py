@@ -0,0 +1,113 @@
+"""
+Run instrumentation: wall-clock timers for each pipeline stage (Excel parsing, prompt building,
+generation, validation, export) plus per-call latency histograms, token throughput and
+error/retry counts. One RunMetrics collects a whole run and exports it as JSON.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from .usage import percentile
+
+# Upper bounds, in seconds, of the per-call latency histogram buckets; slower calls go in a final overflow bucket.
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+
+def latency_histogram(latencies, buckets=LATENCY_BUCKETS):
+    """[{"le": bound, "count": n}, ...] with a final {"le": None} bucket for anything slower."""
+    counts = [0] * (len(buckets) + 1)
+    for latency in latencies:
+        counts[next((i for i, bound in enumerate(buckets) if latency <= bound), len(buckets))] += 1
+    return [{"le": bound, "count": count} for bound, count in zip(list(buckets) + [None], counts)]
+
+
+class RunMetrics:
+    """
+    Thread-safe collector for one run. Stages are timed with timer(); API calls are added in bulk
+    from each run's UsageTracker and RateLimitScheduler by add_calls.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.latencies = []
+        self.first_token_latencies = []
+        self.tokens = {"prompt": 0, "cached": 0, "completion": 0}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["count"] += 1
+            stage["total_s"] += seconds
+            stage["max_s"] = max(stage["max_s"], seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_calls(self, usage, scheduler_stats=None, errors=0):
+        """Folds in the UsageTracker and scheduler stats of a finished run_llm_calls_* invocation."""
+        with self._lock:
+            self.latencies.extend(usage.latencies)
+            self.first_token_latencies.extend(usage.first_token_latencies)
+            self.tokens["prompt"] += usage.prompt_tokens
+            self.tokens["cached"] += usage.cached_tokens
+            self.tokens["completion"] += usage.completion_tokens
+        self.count("api_calls", usage.calls)
+        self.count("cache_hits", usage.cache_hits)
+        self.count("api_errors", errors)
+        for key, value in (scheduler_stats or {}).items():
+            if key != "requests":
+                self.count(key, value)
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            first_token_latencies = sorted(self.first_token_latencies)
+            call_seconds = sum(latencies)
+            generation_seconds = sum(stage["total_s"] for name, stage in self.stages.items() if name.startswith("generate:"))
+            return {
+                "started_at": self.started,
+                "stages": {
+                    name: {**stage, "mean_s": stage["total_s"] / stage["count"]}
+                    for name, stage in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "tokens": dict(self.tokens),
+                # Per call: how fast a single response is written. Overall: what the whole run achieved.
+                "tokens_per_second_per_call": self.tokens["completion"] / call_seconds if call_seconds else 0.0,
+                "tokens_per_second_overall": self.tokens["completion"] / generation_seconds if generation_seconds else 0.0,
+                "latency": {
+                    "samples": len(latencies),
+                    "mean_s": call_seconds / len(latencies) if latencies else 0.0,
+                    "p50_s": percentile(latencies, 0.50),
+                    "p95_s": percentile(latencies, 0.95),
+                    "p99_s": percentile(latencies, 0.99),
+                    "max_s": latencies[-1] if latencies else 0.0,
+                    "histogram": latency_histogram(latencies),
+                },
+                "time_to_first_token": {
+                    "samples": len(first_token_latencies),
+                    "p50_s": percentile(first_token_latencies, 0.50),
+                    "p95_s": percentile(first_token_latencies, 0.95),
+                },
+            }
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+
+def timed(metrics, name):
+    """metrics.timer(name), or a no-op when no RunMetrics is being collected."""
+    return metrics.timer(name) if metrics is not None else nullcontext()
@@ -0,0 +1,481 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
+
+import pandas as pd
+
+from .batch import run_llm_calls_in_batch
+from .cache import get_summary_cache
+from .checkpoint import COMMENTS_STAGE, FUSED_STAGE, SCORES_STAGE
+from .config import BATCH_POLL_INTERVAL, DEFAULT_MAX_CONCURRENCY, STREAM_PREVIEW_INTERVAL
+from .incremental import FINGERPRINT_COLUMN, RESULT_COLUMNS, diff_inputs, format_diff, score_fingerprints, with_comments_fingerprint
+from .llm import API_ERROR_RESULT, RateLimitScheduler, is_well_formed, request_summary
+from .metrics import timed
+from .progress import ProgressReporter
+from .prompts import build_comment_request, build_fused_request, build_score_requests, index_comments, normalize_person_code, select_people
+from .usage import UsageTracker, format_usage_report
+from .validation import (
+    API_ERROR_ISSUE,
+    MISSING_OPENING_ISSUE,
+    STATUS_COLUMN,
+    add_opening,
+    apply_repair,
+    build_repair_request,
+    describe_issues,
+    find_failed_rows,
+    needs_full_resend,
+    validate_stage_result,
+)
+
+
+def run_llm_calls_concurrently(requests, settings, max_workers=DEFAULT_MAX_CONCURRENCY, on_complete=None, cache_mode="use", reporter=None,
+                               structured=False, stream=False, on_preview=None, metrics=None, usage=None):
+    """
+    Runs request_summary over a list of (system_prompt, user_content) requests using a bounded thread pool.
+    Results are returned in the same order as the requests; a failed call yields API_ERROR_RESULT.
+    If given, on_complete(index, done_count, result, ok) is called from the calling thread each
+    time a call finishes, so callers can update progress and checkpoint finished people.
+    All workers share one RateLimitScheduler, which may run fewer than max_workers calls at once
+    while the deployment is throttling. cache_mode is one of the CACHE_MODES keys. Token usage and
+    latency are added to the UsageTracker `usage` if given, for the caller to report once for the
+    whole run, and otherwise reported through the reporter once all calls finish. structured and
+    stream are passed on to request_summary. While streaming, on_preview([(index, text so far, seconds to
+    first token), ...]) is called from the calling thread with the calls still in flight. If given,
+    the calls' latencies, tokens, errors and retries are added to the RunMetrics `metrics`.
+    """
+    reporter = reporter or ProgressReporter()
+    results = [None] * len(requests)
+    if not requests:
+        return results
+
+    scheduler = RateLimitScheduler(max_concurrency=max_workers)
+    calls_usage = UsageTracker()
+    cache = None if cache_mode == "bypass" else get_summary_cache()
+    call_llm = partial(request_summary, settings=settings, scheduler=scheduler, cache=cache, refresh_cache=(cache_mode == "refresh"), usage=calls_usage,
+                       structured=structured, stream=stream)
+
+    # Workers stream into `live`; the calling thread reads it between completions.
+    live = {}
+    live_lock = threading.Lock()
+    def on_delta(idx, text, time_to_first_token):
+        with live_lock:
+            live[idx] = (text, time_to_first_token)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        futures = {
+            executor.submit(call_llm, request, on_delta=partial(on_delta, idx) if stream else None): idx
+            for idx, request in enumerate(requests)
+        }
+        pending = set(futures)
+        done_count = 0
+        errors = 0
+        while pending:
+            finished, pending = wait(pending, timeout=STREAM_PREVIEW_INTERVAL if stream else None, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx = futures[future]
+                done_count += 1
+                try:
+                    result = future.result()
+                    ok = is_well_formed(result)
+                except Exception as e:
+                    reporter.error(f"An error occurred while calling the OpenAI API: {e}")
+                    result, ok = API_ERROR_RESULT, False
+                    errors += 1
+                with live_lock:
+                    live.pop(idx, None)
+                results[idx] = result
+                if on_complete:
+                    on_complete(idx, done_count, result, ok)
+            if stream and on_preview:
+                with live_lock:
+                    streams = [(idx, text, time_to_first_token) for idx, (text, time_to_first_token) in sorted(live.items())]
+                on_preview(streams)
+
+    stats = scheduler.stats
+    if metrics is not None:
+        metrics.add_calls(calls_usage, stats, errors)
+    if stats["throttled"] or stats["retries"]:
+        reporter.info(
+            f"Azure OpenAI throttled {stats['throttled']} request(s); {stats['retries']} retr(ies) were made "
+            f"and {stats['failures']} call(s) ultimately failed."
+        )
+    if usage is not None:
+        usage.merge(calls_usage)
+    else:
+        reporter.info(format_usage_report(calls_usage.summary()))
+    return results
+
+
+def _run_stage(stage, labels, requests, settings, message, reporter, journal=None, max_workers=DEFAULT_MAX_CONCURRENCY,
+               cache_mode="use", execution_mode="interactive", batch_poll_interval=BATCH_POLL_INTERVAL, structured=False,
+               stream=False, metrics=None, usage=None):
+    """
+    Generates summaries for one stage, restoring people already in the checkpoint journal and
+    journaling each new well-formed result as soon as it arrives. The remaining requests are sent
+    either as concurrent interactive calls or as one Batch API job, per execution_mode.
+    structured marks the requests as fused JSON requests. Interactive calls are streamed if stream
+    is set, with live previews going to reporter.preview. If given, generation and repair are timed
+    into the RunMetrics `metrics`, and their calls are added to the UsageTracker `usage` instead of
+    being reported per call batch. Returns results in input order.
+    """
+    # The journal is keyed on the full prompt text, whichever way it is split into messages.
+    prompts = ["".join(request) for request in requests]
+    results = [None] * len(requests)
+    pending = []
+    for idx, (label, prompt) in enumerate(zip(labels, prompts)):
+        resumed = journal.get(stage, label, prompt) if journal is not None else None
+        if resumed is not None:
+            results[idx] = resumed
+        else:
+            pending.append(idx)
+
+    if metrics is not None:
+        metrics.count("resumed", len(prompts) - len(pending))
+    if len(pending) < len(prompts):
+        reporter.info(f"Resuming: {len(prompts) - len(pending)} of {len(prompts)} restored from the checkpoint journal.")
+
+    total = len(pending)
+    reporter.start(total)
+    def on_complete(pos, done_count, result, ok):
+        idx = pending[pos]
+        results[idx] = result
+        # Results that fail validation are journaled once repaired, so a restart retries the rest.
+        if ok and journal is not None and not validate_stage_result(stage, result):
+            journal.record(stage, labels[idx], prompts[idx], *result)
+        reporter.advance(done_count, total, message.format(labels[idx]))
+
+    pending_requests = [requests[idx] for idx in pending]
+    with timed(metrics, f"generate:{stage}"):
+        if execution_mode == "batch":
+            run_llm_calls_in_batch(
+                pending_requests,
+                settings,
+                stage,
+                on_complete=on_complete,
+                reporter=reporter,
+                journal=journal,
+                poll_interval=batch_poll_interval,
+                structured=structured,
+                cache_mode=cache_mode,
+                metrics=metrics,
+                usage=usage,
+            )
+        else:
+            run_llm_calls_concurrently(
+                pending_requests,
+                settings,
+                max_workers=max_workers,
+                on_complete=on_complete,
+                cache_mode=cache_mode,
+                reporter=reporter,
+                structured=structured,
+                stream=stream,
+                on_preview=lambda streams: reporter.preview([(labels[pending[pos]], text, ttft) for pos, text, ttft in streams]),
+                metrics=metrics,
+                usage=usage,
+            )
+
+    with timed(metrics, f"validate_repair:{stage}"):
+        repaired, failing = _repair_stage(
+            stage, requests, results, settings, reporter, max_workers=max_workers, cache_mode=cache_mode, structured=structured,
+            resend_failed=(execution_mode != "batch"), metrics=metrics, usage=usage,
+        )
+    if metrics is not None:
+        metrics.count("repaired", len(repaired))
+        metrics.count("still_failing", len(failing))
+    if journal is not None:
+        for idx in repaired:
+            journal.record(stage, labels[idx], prompts[idx], *results[idx])
+    for idx in failing:
+        reporter.error(f"Summary for {labels[idx]} still fails validation: {', '.join(validate_stage_result(stage, results[idx]))}.")
+    return results
+
+
+def _fix_opening(stage, result):
+    """Adds a missing mandatory opening locally; no call is needed for that."""
+    if MISSING_OPENING_ISSUE in validate_stage_result(stage, result):
+        return add_opening(result[0]), result[1]
+    return result
+
+
+def _repair_stage(stage, requests, results, settings, reporter, max_workers=DEFAULT_MAX_CONCURRENCY, cache_mode="use", structured=False,
+                  resend_failed=True, metrics=None, usage=None):
+    """
+    Validates a stage's results and repairs the failures in place with the smallest follow-up that
+    fixes each one (see eswriter.validation). Cut-off or malformed responses and fused responses
+    with an Arabic-only comment paragraph are re-sent in full, and so are failed API calls unless
+    resend_failed is unset: after a Batch API run they are left failed rather than silently re-run
+    at interactive prices. A missing Arabic half or an over-long summary gets a short follow-up
+    call. Follow-ups are always interactive calls, since there are few of them. Returns (repaired
+    indices, indices still failing).
+    """
+    failing = [idx for idx, result in enumerate(results) if validate_stage_result(stage, result)]
+    if not failing:
+        return [], []
+    reporter.info(f"Validation: {len(failing)} of {len(results)} response(s) need repair.")
+    call_options = {"max_workers": max_workers, "cache_mode": cache_mode, "reporter": reporter, "metrics": metrics, "usage": usage}
+
+    # Only results that a follow-up call cannot fix are regenerated in full.
+    retries = []
+    skipped = 0
+    for idx in failing:
+        issues = validate_stage_result(stage, results[idx])
+        if issues == [API_ERROR_ISSUE] and not resend_failed:
+            skipped += 1
+        elif needs_full_resend(results[idx], issues):
+            retries.append(idx)
+    if skipped:
+        reporter.info(f"Validation: {skipped} failed batch request(s) are not re-sent as interactive calls.")
+    retried = run_llm_calls_concurrently([requests[idx] for idx in retries], settings, structured=structured, **call_options)
+    for idx, result in zip(retries, retried):
+        results[idx] = result
+
+    repairs = []
+    for idx in failing:
+        results[idx] = _fix_opening(stage, results[idx])
+        issues = validate_stage_result(stage, results[idx])
+        request = build_repair_request(stage, results[idx], issues) if issues else None
+        if request is not None:
+            repairs.append((idx, issues, request))
+
+    repaired = run_llm_calls_concurrently([request for _, _, request in repairs], settings, **call_options)
+    for (idx, issues, _), result in zip(repairs, repaired):
+        results[idx] = _fix_opening(stage, apply_repair(results[idx], issues, result))
+
+    still_failing = [idx for idx in failing if validate_stage_result(stage, results[idx])]
+    reporter.info(f"Validation: {len(failing) - len(still_failing)} repaired, {len(still_failing)} still failing.")
+    return sorted(set(failing) - set(still_failing)), still_failing
+
+
+@contextmanager
+def _run_usage(run_options, reporter):
+    """
+    Collects every call of a process_* run, across stages, repairs and re-sends, into one
+    UsageTracker in run_options and reports it once at the end. If the caller already passed a
+    tracker as run_options["usage"], calls are added to it and reporting is left to the caller.
+    """
+    if run_options.get("usage") is not None:
+        yield
+        return
+    usage = run_options["usage"] = UsageTracker()
+    yield
+    reporter.info(format_usage_report(usage.summary()))
+
+
+def process_scores(df, settings, journal=None, reporter=None, compact=True, **run_options):
+    """
+    Processes the scores dataframe to generate initial summaries. With compact set, competency
+    categories and paragraphs are computed locally and sent as JSON (see build_score_payloads).
+    Each row also carries the fingerprint of the inputs it was generated from (see eswriter.incremental)
+    and a status listing any issues left after repair.
+    run_options are max_workers, cache_mode, execution_mode, batch_poll_interval, stream, metrics and
+    usage (see _run_stage). Token usage and latency are reported once at the end unless usage is given.
+    """
+    reporter = reporter or ProgressReporter()
+    with timed(run_options.get("metrics"), "build_prompts"):
+        person_requests = build_score_requests(df, compact=compact)
+        fingerprints = score_fingerprints(df)
+    person_names = [person_name for person_name, _ in person_requests]
+    requests = [request for _, request in person_requests]
+
+    with _run_usage(run_options, reporter):
+        summaries = _run_stage(
+            SCORES_STAGE, person_names, requests, settings, "Generated summary for {}...",
+            reporter, journal=journal, **run_options,
+        )
+
+    return _results_frame(person_names, summaries, fingerprints, [SCORES_STAGE] * len(summaries))
+
+
+def process_comments_and_append(results_df, comments_df, settings, journal=None, reporter=None, **run_options):
+    """
+    Processes comments and appends them to the existing summaries. Rows that already failed get no
+    comment request, and a comment paragraph that still fails validation after repair is left out
+    and recorded in the row's status instead. run_options are as for process_scores.
+    """
+    reporter = reporter or ProgressReporter()
+    row_labels = []
+    person_codes = []
+    requests = []
+    with timed(run_options.get("metrics"), "build_prompts"):
+        comments_by_person = index_comments(comments_df)
+        for i, row in results_df.iterrows():
+            if _row_failed(row):
+                continue
+            person_code = row['Person']
+            person_comments = comments_by_person.get(normalize_person_code(person_code))
+            if FINGERPRINT_COLUMN in results_df and not pd.isna(row[FINGERPRINT_COLUMN]):
+                results_df.at[i, FINGERPRINT_COLUMN] = with_comments_fingerprint(row[FINGERPRINT_COLUMN], person_comments)
+
+            if person_comments:
+                row_labels.append(i)
+                person_codes.append(person_code)
+                requests.append(build_comment_request(row['English Summary'], person_comments))
+
+    with _run_usage(run_options, reporter):
+        comment_summaries = _run_stage(
+            COMMENTS_STAGE, person_codes, requests, settings, "Summarized comments for {}...",
+            reporter, journal=journal, **run_options,
+        )
+
+    for i, result in zip(row_labels, comment_summaries):
+        issues = validate_stage_result(COMMENTS_STAGE, result)
+        if issues:
+            # Keep the failure visible instead of appending placeholder text to a valid summary.
+            results_df.at[i, STATUS_COLUMN] = describe_issues(COMMENTS_STAGE, issues)
+            if FINGERPRINT_COLUMN in results_df:
+                results_df.at[i, FINGERPRINT_COLUMN] = None
+            continue
+        eng_comment_summary, ar_comment_summary = result
+        results_df.at[i, 'English Summary'] += f"\n\n{eng_comment_summary}"
+        results_df.at[i, 'Arabic Summary'] += f"\n\n{ar_comment_summary}"
+
+    return results_df
+
+
+def _row_failed(row):
+    """Whether a result row carries a status from an earlier stage."""
+    status = row.get(STATUS_COLUMN)
+    return not (status is None or pd.isna(status) or not str(status).strip())
+
+
+def process_scores_with_comments(df, comments_df, settings, journal=None, reporter=None, compact=True, **run_options):
+    """
+    Fused alternative to process_scores followed by process_comments_and_append, for when the
+    comments file is available up front. People with comments get one request that returns the
+    score summary and the comment paragraph together as JSON; people without comments get the
+    plain score request. Returns the same final dataframe as the two-stage flow.
+    """
+    reporter = reporter or ProgressReporter()
+    fused = []
+    plain = []
+    fingerprints = []
+    stages = []
+    with timed(run_options.get("metrics"), "build_prompts"):
+        comments_by_person = index_comments(comments_df)
+        person_requests = build_score_requests(df, compact=compact)
+        for idx, ((person_name, request), fingerprint) in enumerate(zip(person_requests, score_fingerprints(df))):
+            person_comments = comments_by_person.get(normalize_person_code(person_name))
+            fingerprints.append(with_comments_fingerprint(fingerprint, person_comments))
+            if person_comments:
+                fused.append((idx, build_fused_request(request, person_comments)))
+                stages.append(FUSED_STAGE)
+            else:
+                plain.append((idx, request))
+                stages.append(SCORES_STAGE)
+    person_names = [person_name for person_name, _ in person_requests]
+
+    summaries = [None] * len(person_requests)
+    with _run_usage(run_options, reporter):
+        for stage, stage_requests, message, structured in (
+            (FUSED_STAGE, fused, "Generated summary and comment paragraph for {}...", True),
+            (SCORES_STAGE, plain, "Generated summary for {}...", False),
+        ):
+            if not stage_requests:
+                continue
+            stage_results = _run_stage(
+                stage, [person_names[idx] for idx, _ in stage_requests], [request for _, request in stage_requests],
+                settings, message, reporter, journal=journal, structured=structured, **run_options,
+            )
+            for (idx, _), result in zip(stage_requests, stage_results):
+                summaries[idx] = result
+
+    return _results_frame(person_names, summaries, fingerprints, stages)
+
+
+def _results_frame(person_names, summaries, fingerprints, stages):
+    """
+    Result rows with the issues each summary still has after repair as its status. Failed rows get
+    no fingerprint, so an incremental run regenerates them.
+    """
+    results = []
+    for person_name, summary, fingerprint, stage in zip(person_names, summaries, fingerprints, stages):
+        status = describe_issues(stage, validate_stage_result(stage, summary))
+        results.append({
+            "Person": person_name,
+            "English Summary": summary[0],
+            "Arabic Summary": summary[1],
+            FINGERPRINT_COLUMN: None if status else fingerprint,
+            STATUS_COLUMN: status,
+        })
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+def _generate_for(person_names, scores_df, settings, comments_df=None, fused=True, journal=None, reporter=None, compact=True, **run_options):
+    """
+    Runs the full flow for just the given people of scores_df: scores only, or with comments either
+    fused or in two stages. Returns {normalised person code: result row}.
+    """
+    codes = {normalize_person_code(person) for person in person_names}
+    people = scores_df.iloc[1:, 0].map(normalize_person_code).isin(codes)
+    subset_df = pd.concat([scores_df.iloc[:1], scores_df.iloc[1:][people]])
+
+    if comments_df is not None and fused:
+        generated_df = process_scores_with_comments(subset_df, comments_df, settings, journal=journal, reporter=reporter, compact=compact, **run_options)
+    else:
+        generated_df = process_scores(subset_df, settings, journal=journal, reporter=reporter, compact=compact, **run_options)
+        if comments_df is not None:
+            generated_df = process_comments_and_append(generated_df, comments_df, settings, journal=journal, reporter=reporter, **run_options)
+    return {normalize_person_code(row['Person']): row for _, row in generated_df.iterrows()}
+
+
+def retry_failed_rows(results_df, scores_df, settings, comments_df=None, fused=True, journal=None, reporter=None, compact=True, **run_options):
+    """
+    Regenerates only the people whose rows in results_df fail validation (see find_failed_rows) and
+    returns a copy of results_df with those rows replaced. With comments_df, the comment paragraph is
+    regenerated too, fused or in a second stage. Cached responses are bypassed for these people,
+    since the cached ones are what failed.
+    """
+    reporter = reporter or ProgressReporter()
+    failed = find_failed_rows(results_df)
+    if not failed.any():
+        return results_df
+    reporter.info(f"Retrying {int(failed.sum())} failed row(s).")
+
+    if run_options.get("cache_mode") != "bypass":
+        run_options["cache_mode"] = "refresh"
+    with _run_usage(run_options, reporter):
+        retried = _generate_for(
+            results_df.loc[failed, 'Person'], scores_df, settings, comments_df=comments_df, fused=fused,
+            journal=journal, reporter=reporter, compact=compact, **run_options,
+        )
+
+    results_df = results_df.copy()
+    for i in results_df.index[failed]:
+        row = retried.get(normalize_person_code(results_df.at[i, 'Person']))
+        if row is not None:
+            for column in RESULT_COLUMNS[1:]:
+                results_df.at[i, column] = row.get(column)
+    return results_df
+
+
+def regenerate_changed(previous_df, scores_df, settings, comments_df=None, fused=True, journal=None, reporter=None, compact=True, **run_options):
+    """
+    Incremental run over a corrected upload: only people who are new or whose input fingerprint
+    differs from previous_df are regenerated (see diff_inputs); everyone else keeps their previous
+    row. People no longer in the scores file are dropped. Returns rows in scores-file order.
+    """
+    reporter = reporter or ProgressReporter()
+    diff = diff_inputs(previous_df, scores_df, comments_df)
+    reporter.info(f"Compared with the previous results: {format_diff(diff)}")
+
+    to_generate = diff["changed"] + diff["new"]
+    generated = {}
+    if to_generate:
+        with _run_usage(run_options, reporter):
+            generated = _generate_for(
+                to_generate, scores_df, settings, comments_df=comments_df, fused=fused,
+                journal=journal, reporter=reporter, compact=compact, **run_options,
+            )
+    previous = {normalize_person_code(row['Person']): row for _, row in previous_df.iterrows()}
+
+    rows = []
+    for person in select_people(scores_df).iloc[:, 0]:
+        code = normalize_person_code(person)
+        row = generated.get(code)
+        if row is None:
+            row = previous[code]
+        # Reports written before a column existed are read without it.
+        rows.append({"Person": person, **{column: row.get(column) for column in RESULT_COLUMNS[1:]}})
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
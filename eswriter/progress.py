@@ -0,0 +1,29 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """
+    Receives progress from a pipeline run. This default implementation only logs; the Streamlit
+    app and the CLI subclass it. All methods are called from the thread that started the run.
+    """
+
+    def start(self, total):
+        pass
+
+    def advance(self, done, total, message):
+        logger.info("[%d/%d] %s", done, total, message)
+
+    def preview(self, streams):
+        """
+        Live text of the responses still streaming in, as (label, text so far, seconds to first token)
+        tuples. Called periodically during streamed runs.
+        """
+        pass
+
+    def info(self, message):
+        logger.info(message)
+
+    def error(self, message):
+        logger.error(message)
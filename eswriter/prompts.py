@@ -0,0 +1,372 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import pandas as pd
+
+from .scoring import (
+    BOTTOM_HALF,
+    CLEAR_STRENGTH,
+    DEVELOPMENT_AREA,
+    POTENTIAL_STRENGTH,
+    TOP_HALF,
+    build_compact_payloads,
+    indicator_reference,
+)
+
+# One competency column of the scores file, followed by the columns of its indicators.
+Competency = namedtuple("Competency", ["name", "column", "indicators"])
+Indicator = namedtuple("Indicator", ["text", "column"])
+
+# Indicator columns are named after their competency plus a number, e.g. "Adaptability 3".
+INDICATOR_COLUMN = re.compile(r"^(?P<competency>.*\S)\s+\d+$")
+
+MANDATORY_OPENING = "Your participation in the assessment center provided insight into how you demonstrate the leadership competencies in action. The feedback below highlights observed strengths and opportunities for development to support your continued growth."
+ARABIC_OPENING = "نشكرك على مشاركتك في مركز التقييم، مما أتاح لنا رؤية متعمقة لكيفية تجسيدك للكفاءات القيادية عمليًا."
+OUTPUT_SEPARATOR_RULE = "* **Output Separator:** You MUST separate the English summary from the Arabic summary with the exact delimiter: '---ARABIC_SUMMARY---'."
+SCORE_TASK = "**## TASK: GENERATE SCORE-BASED SUMMARY FOR THE FOLLOWING PERSON**"
+
+# Fused requests answer with one JSON object holding both the score summary and the comment paragraph.
+FUSED_RESPONSE_FIELDS = ("english_summary", "arabic_summary", "english_comment_summary", "arabic_comment_summary")
+FUSED_OUTPUT_RULE = "* **Output Format:** Return JSON as described in the Output Format section below, with each language in its own field."
+
+
+def get_score_summary_prompt(competency_count=8, indicator_count=4):
+    """
+    Returns the prompt for generating the main summary from scores.
+    indicator_count may be None when competencies have differing numbers of indicators.
+    """
+    indicator_phrase = f"{indicator_count} Indicator Scores" if indicator_count else "the Indicator Scores"
+    return f"""
+**## Persona**
+You are an expert talent management analyst and a master writer. Your style is formal, professional, objective, and constructive. You synthesize quantitative performance data into a rich, qualitative, behavioral-focused narrative. You are writing for a male individual, using the third person (`he`/`his`/`him`).
+
+**## Core Objective**
+Generate a sophisticated, multi-paragraph performance summary based on scores from {competency_count} leadership competencies. The summary will have 2 or 3 paragraphs based on the logic below. The summary must be generated in both English and Arabic.
+
+**## Input Data Profile**
+You will receive a data set for one individual containing: {competency_count} Competency Names and their average scores, plus {indicator_phrase} and Texts for each competency.
+
+**## Core Logic & Execution Flow**
+
+**Step 1: Data Analysis & Categorization**
+1.  Categorize each of the {competency_count} competencies based on its average score:
+    * **Clear Strength:** Average score >= 4.0
+    * **Potential Strength:** Average score between 2.6 and 3.9
+    * **Development Area:** Average score <= 2.5
+2.  Count the number of distinct categories present for the candidate (1, 2, or 3).
+
+**Step 2: Dynamic Summary Construction**
+1.  **Mandatory Opening:** The English summary MUST begin with this exact text: "{MANDATORY_OPENING}"
+2.  **Paragraphing Rules:** Follow this logic to structure the report:
+
+    * **IF 3 Categories are present (Strengths, Potential, and Development):**
+        * **Paragraph 1 (Clear Strengths):** Start with "You display clear strengths in several areas of leadership." Detail all "Clear Strength" competencies. Synthesize multiple high-scoring indicators into a narrative and add a concluding phrase about the impact.
+        * **Paragraph 2 (Potential Strengths):** Start with "In addition, there are areas where you demonstrate potential strengths that can be further leveraged." Detail all "Potential Strength" competencies. Describe the positives, then transition ("However, there is room to...") to explain the development gap.
+        * **Paragraph 3 (Development Areas):** Start with "In relation to the development areas..." Detail all "Development Area" competencies. **This paragraph must be purely developmental.** Focus only on what needs improvement based on the lowest-scoring indicators. Do not mix in positive framing.
+
+    * **IF 2 Categories are present:**
+        * **Paragraph 1:** Address the more positive of the two categories (Strengths > Potential Strengths).
+        * **Paragraph 2:** Address the remaining category. The language must be purely developmental if it is the "Development Area" category.
+
+    * **IF only 1 Category is present (e.g., all are 'Clear Strengths'):**
+        * **Paragraph 1:** Address the top half of the competencies (those with the highest average scores).
+        * **Paragraph 2:** Address the bottom half of the competencies. Even if they are still positive, frame this paragraph as covering competencies that, while strong, are not as pronounced as those in the first paragraph.
+        * The same logic applies if all are 'Potential Strengths' or all are 'Development Areas'. This ensures a minimum of two paragraphs.
+
+**## Writing Standards & Constraints**
+* **Word Count:** Maximum 400 words total per language (excluding the mandatory opening).
+* **Source Fidelity:** Base all statements *strictly* on the indicator language.
+* **Behavioral Focus:** No technical or industry-specific jargon.
+{OUTPUT_SEPARATOR_RULE}
+
+**## Bilingual Generation Mandate**
+* Generate in **both English and Arabic**, following the same dynamic structure and professional tone.
+* **Arabic Opening:** The first sentence thanking the participant MUST be in formal, written Arabic (`Lughat al-Fusha`), for example: "{ARABIC_OPENING}"
+
+---
+{SCORE_TASK}
+"""
+
+def get_compact_score_summary_prompt(indicator_texts):
+    """
+    Returns the score prompt for precomputed JSON payloads. Categorisation and paragraph grouping are
+    already done locally, and indicator texts are listed once in a reference table keyed by indicator ID.
+    """
+    reference = "\n".join(f"* `{indicator}`: {text}" for indicator, text in indicator_texts.items())
+    return f"""
+**## Persona**
+You are an expert talent management analyst and a master writer. Your style is formal, professional, objective, and constructive. You synthesize quantitative performance data into a rich, qualitative, behavioral-focused narrative. You are writing for a male individual, using the third person (`he`/`his`/`him`).
+
+**## Core Objective**
+Generate a sophisticated, multi-paragraph performance summary from pre-analysed leadership competency scores. The summary must be generated in both English and Arabic.
+
+**## Input Data Profile**
+You will receive one JSON object per individual. The analysis is already done:
+* `paragraphs` lists the paragraphs to write, in order. Each has a `focus` and the `competencies` it covers, highest score first.
+* Each competency has its average `score` and its `indicators` as `{{indicator ID: score}}`. Indicator texts are in the Indicator Reference below.
+* Categories: **{CLEAR_STRENGTH}** (score >= 4.0), **{POTENTIAL_STRENGTH}** (2.6 to 3.9), **{DEVELOPMENT_AREA}** (<= 2.5).
+
+**## Summary Construction**
+1.  **Mandatory Opening:** The English summary MUST begin with this exact text: "{MANDATORY_OPENING}"
+2.  **Paragraphs:** Write exactly one paragraph per entry in `paragraphs`, in the given order, covering all of its competencies:
+    * **focus "{CLEAR_STRENGTH}":** Start with "You display clear strengths in several areas of leadership." Synthesize multiple high-scoring indicators into a narrative and add a concluding phrase about the impact.
+    * **focus "{POTENTIAL_STRENGTH}":** If it follows a Clear Strength paragraph, start with "In addition, there are areas where you demonstrate potential strengths that can be further leveraged." Describe the positives, then transition ("However, there is room to...") to explain the development gap.
+    * **focus "{DEVELOPMENT_AREA}":** Start with "In relation to the development areas..." **This paragraph must be purely developmental.** Focus only on what needs improvement based on the lowest-scoring indicators. Do not mix in positive framing.
+    * **focus "{TOP_HALF}" / "{BOTTOM_HALF}":** All competencies share the paragraph's `category`. Write the top half in the tone of that category; frame the bottom half as competencies that, while consistent with the same category, are not as pronounced as those in the first paragraph.
+
+**## Writing Standards & Constraints**
+* **Word Count:** Maximum 400 words total per language (excluding the mandatory opening).
+* **Source Fidelity:** Base all statements *strictly* on the indicator language.
+* **Behavioral Focus:** No technical or industry-specific jargon.
+{OUTPUT_SEPARATOR_RULE}
+
+**## Bilingual Generation Mandate**
+* Generate in **both English and Arabic**, following the same dynamic structure and professional tone.
+* **Arabic Opening:** The first sentence thanking the participant MUST be in formal, written Arabic (`Lughat al-Fusha`), for example: "{ARABIC_OPENING}"
+
+**## Indicator Reference**
+{reference}
+
+---
+{SCORE_TASK}
+"""
+
+def get_comment_summary_prompt():
+    """Returns the new, specialized prompt for summarizing qualitative comments."""
+    return """
+**## Persona**
+You are a discerning talent management analyst, skilled at synthesizing raw, unstructured feedback into a concise and professional summary. Your focus is purely on constructive, developmental themes.
+
+**## Core Objective**
+Analyze a list of raw comments for an individual and generate a single, final summary paragraph. This paragraph should be no more than 50 words. The summary must be in both English and Arabic.
+
+**## Input Data Profile**
+1.  **The Main Report:** The already-written, score-based summary.
+2.  **Raw Comments:** A list of verbatim comments from colleagues.
+
+**## Core Logic & Execution Flow**
+1.  **Filter Comments:** First, you MUST filter the raw comments based on these rules:
+    * **IGNORE:** Offensive, irrelevant, purely personal, or overly judgmental comments.
+    * **FOCUS ON:** Developmental aspects, constructive criticism, and actionable feedback.
+2.  **Check for Contradictions:** **This is the most important rule.** Compare the themes in the filtered comments with the main report provided. If a comment's theme directly contradicts a "Clear Strength" identified in the main report, you MUST ignore that comment. The main report is the primary source of truth.
+3.  **Synthesize Themes:** From the remaining, non-contradictory comments, identify 1-2 key developmental themes. If the comments are varied, select the most impactful points.
+4.  **Draft the Summary:** Write a single paragraph that summarizes these themes.
+    * **Introduction:** Start with a phrase like "Additionally, feedback suggests..." or "Further feedback indicates...".
+    * **Body:** Concisely state the key themes. Rephrase any judgmental language into professional, developmental terms (e.g., "He is too quiet" becomes "he would benefit from increasing his visibility in senior forums.").
+5.  **Final Polish:** Ensure the paragraph flows naturally when appended to the main report.
+
+**## Writing Standards & Constraints**
+* **Word Count:** Maximum 50 words per language.
+* **Tone:** Professional, constructive, and forward-looking.
+* **Consistency:** The summary MUST NOT contradict the main report.
+* **Output Separator:** You MUST separate the English summary from the Arabic summary with the exact delimiter: '---ARABIC_SUMMARY---'.
+
+
+**## Bilingual Generation Mandate: English and Arabic**
+* **Primary Task:** Generate the summary in **both English and Arabic**, following all rules above.
+* **Arabic Language Standards:**
+    * **Nuance and Professionalism:** The Arabic translation must not be a literal, word-for-word translation. It must be crafted with the nuance, formality, and flow of a native Arabic-speaking HR professional.
+    * **Tone:** The tone should be formal, respectful, and constructive, using professional terminology appropriate for a corporate setting.
+    * **Contextual Integrity:** Ensure the meaning and intent of the developmental feedback are preserved and culturally aligned.
+
+---
+**## TASK: ANALYZE THE FOLLOWING COMMENTS AND GENERATE A 50-WORD SUMMARY PARAGRAPH TO APPEND TO THE MAIN REPORT PROVIDED.**
+"""
+
+@lru_cache(maxsize=8)
+def get_fused_summary_prompt(score_prompt):
+    """
+    Extends a score prompt (full or compact) so the same call also writes the comment paragraph,
+    returning both parts as fields of one JSON object instead of delimited text.
+    """
+    instructions = score_prompt.rsplit(f"---\n{SCORE_TASK}", 1)[0].replace(OUTPUT_SEPARATOR_RULE, FUSED_OUTPUT_RULE)
+    fields = ", ".join(f'"{field}"' for field in FUSED_RESPONSE_FIELDS)
+    return instructions + f"""**## Comment Paragraph**
+The person's data is followed by raw comments from colleagues. After writing the score-based summary, write one more paragraph of no more than 50 words per language from those comments:
+1.  **Filter Comments:** IGNORE offensive, irrelevant, purely personal, or overly judgmental comments. FOCUS ON developmental aspects, constructive criticism, and actionable feedback.
+2.  **Check for Contradictions:** **This is the most important rule.** If a comment's theme directly contradicts a "Clear Strength" in the score-based summary, you MUST ignore that comment. The scores are the primary source of truth.
+3.  **Synthesize Themes:** From the remaining comments, identify 1-2 key developmental themes.
+4.  **Draft the Paragraph:** Start with a phrase like "Additionally, feedback suggests..." or "Further feedback indicates...". Rephrase any judgmental language into professional, developmental terms. The Arabic paragraph must not be a literal translation; write it with the nuance and formality of a native Arabic-speaking HR professional.
+5.  If no comment remains after filtering, return empty strings for both comment paragraph fields.
+
+**## Output Format**
+Return a single JSON object with exactly these string fields: {fields}.
+* `english_summary` / `arabic_summary`: the score-based summary in each language, including the mandatory opening.
+* `english_comment_summary` / `arabic_comment_summary`: the comment paragraph in each language.
+
+---
+**## TASK: GENERATE THE SCORE-BASED SUMMARY AND THE COMMENT PARAGRAPH FOR THE FOLLOWING PERSON**
+"""
+
+def get_arabic_repair_prompt():
+    """Follow-up prompt asking only for the Arabic half of a response whose Arabic summary was missing."""
+    return f"""
+**## Persona**
+You are an expert talent management analyst and a native Arabic-speaking HR writer. Your style is formal, professional, objective, and constructive.
+
+**## Task**
+You will receive the English version of a performance summary. Write the Arabic version of it, following the same paragraphs, meaning and professional tone.
+* The Arabic must not be a literal, word-for-word translation. Write it in formal, written Arabic (`Lughat al-Fusha`) with the nuance and flow of a native Arabic-speaking HR professional.
+* If the English summary opens by thanking the participant for the assessment center, open with: "{ARABIC_OPENING}"
+* **Output:** Start your reply with the exact delimiter '---ARABIC_SUMMARY---', followed by the Arabic summary only. Do not repeat the English summary.
+"""
+
+def get_shorten_prompt(max_words, require_opening=True):
+    """
+    Follow-up prompt asking to bring an over-long bilingual response within its word limit. The
+    mandatory opening is only mentioned for responses that must start with it.
+    """
+    opening_rule = (
+        f' The mandatory opening sentences ("{MANDATORY_OPENING}" and its Arabic equivalent) do not count towards the limit and must be kept word for word.'
+        if require_opening else ""
+    )
+    return f"""
+**## Persona**
+You are an expert talent management analyst and a master editor, writing in both English and Arabic.
+
+**## Task**
+You will receive a performance summary in English, then the delimiter '---ARABIC_SUMMARY---', then the same summary in Arabic. It is longer than the limit of {max_words} words per language.
+* Shorten both languages to at most {max_words} words each.{opening_rule}
+* Keep the paragraph structure, the first sentence of each paragraph and the meaning. Do not add new content.
+* **Output Separator:** Return the shortened English summary, then the exact delimiter '---ARABIC_SUMMARY---', then the shortened Arabic summary.
+"""
+
+
+def parse_score_schema(df):
+    """
+    Reads the competency/indicator layout of a scores dataframe once. A column named
+    '<competency> <n>' right after its competency is one of its indicators; a competency column
+    repeats its own name in the indicator-definition row (df.iloc[0]), which holds the indicator
+    texts. Raises ValueError for a column that is neither, rather than guessing at the layout.
+    """
+    indicator_definitions = df.iloc[0]
+    competencies = []
+    for position, column in enumerate(df.columns[1:], start=1):
+        match = INDICATOR_COLUMN.match(str(column).strip())
+        if competencies and match and match.group("competency") == str(competencies[-1].name).strip():
+            competencies[-1].indicators.append(Indicator(indicator_definitions.iloc[position], position))
+        elif str(indicator_definitions.iloc[position]).strip() == str(column).strip():
+            competencies.append(Competency(column, position, []))
+        else:
+            raise ValueError(
+                f"Unrecognised scores layout at column '{column}': expected a competency column whose first row "
+                f"repeats its name, or an indicator column named '<competency> <n>' following its competency."
+            )
+    return competencies
+
+
+def select_people(df):
+    """The person rows of a scores dataframe, skipping the definition row, rows without a person and rows marked ERROR."""
+    people_data = df.iloc[1:]
+    keep = people_data.iloc[:, 0].notna() & ~people_data.iloc[:, 1].map(str).str.contains('ERROR', regex=False)
+    return people_data[keep]
+
+
+def render_score_payloads(df, schema):
+    """
+    Renders the per-person competency data block for every person at once, one column at a time.
+    Cells go through str() like the per-row f-strings did, so a blank score renders as 'nan'.
+    Returns (person_names, payloads) as aligned Series.
+    """
+    people_data = select_people(df)
+    person_names = people_data.iloc[:, 0]
+
+    parts = []
+    for competency in schema:
+        parts.append(f"\n**- Competency: {competency.name}** (Average Score: " + people_data.iloc[:, competency.column].map(str) + ")\n")
+        for indicator in competency.indicators:
+            parts.append(f"  - Indicator: '{indicator.text}' | Score: " + people_data.iloc[:, indicator.column].map(str) + "\n")
+
+    header = "**Person's Name:** " + person_names.map(str) + "\n\n**Competency Data:**\n"
+    payloads = header.str.cat(parts) if parts else header
+    return person_names, payloads
+
+
+def build_score_payloads(df, compact=True):
+    """
+    Builds the score prompt template shared by the cohort and the per-person data for every person.
+    With compact set, categories and paragraphs are precomputed and each person is sent as a JSON
+    payload, with indicator texts listed once in the template; otherwise the full indicator text is
+    written out for every person. Returns (template, [(person_name, payload), ...]) in input order.
+    """
+    schema = parse_score_schema(df)
+    if compact:
+        people_data = select_people(df)
+        template = get_compact_score_summary_prompt(indicator_reference(schema))
+        payloads = build_compact_payloads(people_data, schema)
+        return template, list(zip(people_data.iloc[:, 0], payloads))
+
+    indicator_counts = {len(competency.indicators) for competency in schema}
+    template = get_score_summary_prompt(
+        competency_count=len(schema),
+        indicator_count=indicator_counts.pop() if len(indicator_counts) == 1 else None,
+    )
+    person_names, payloads = render_score_payloads(df, schema)
+    return template, list(zip(person_names, payloads))
+
+
+def build_score_requests(df, compact=True):
+    """
+    Builds the score request for every person as (system_prompt, user_content), with the shared
+    template as the system prompt. Returns a list of (person_name, request) pairs in input order.
+    """
+    template, person_payloads = build_score_payloads(df, compact=compact)
+    return [(person_name, (template, payload)) for person_name, payload in person_payloads]
+
+
+def normalize_person_code(person_code):
+    """
+    Canonical form of a person code for matching score rows to comments: trimmed and case-folded,
+    with whole-number floats (how Excel often reads numeric IDs) written without the trailing .0.
+    Returns None for a missing code.
+    """
+    if pd.isna(person_code):
+        return None
+    if isinstance(person_code, float) and person_code.is_integer():
+        person_code = int(person_code)
+    return str(person_code).strip().casefold()
+
+
+def index_comments(comments_df):
+    """
+    Groups the comments file by normalised person code in a single pass.
+    Returns a dict of {person_code: [comment, ...]} with comments in file order; blank comments are dropped.
+    """
+    codes = comments_df['Person Code'].map(normalize_person_code)
+    comments = comments_df['Comments']
+    has_comment = codes.notna() & comments.notna()
+    return {
+        code: group.tolist()
+        for code, group in comments[has_comment].groupby(codes[has_comment], sort=False)
+    }
+
+
+def build_comment_request(main_eng_summary, person_comments):
+    """
+    Builds the comment request for one person as (system_prompt, user_content) from their main
+    English report and raw comments.
+    """
+    comments_block = '\n- '.join(str(c) for c in person_comments)
+    comment_data_prompt = f"**Main Report:**\n{main_eng_summary}\n\n**Raw Comments to Summarize:**\n- {comments_block}"
+    return get_comment_summary_prompt(), comment_data_prompt
+
+
+def build_fused_request(score_request, person_comments):
+    """
+    Turns a person's score request into a fused request that also carries their raw comments, so
+    the score summary and the comment paragraph come back from a single call (see get_fused_summary_prompt).
+    """
+    score_prompt, score_payload = score_request
+    comments_block = '\n- '.join(str(c) for c in person_comments)
+    return get_fused_summary_prompt(score_prompt), f"{score_payload}\n\n**Raw Comments to Summarize:**\n- {comments_block}"
+
+
+def build_arabic_repair_request(english):
+    """Request for just the Arabic half of a summary, given its English half."""
+    return get_arabic_repair_prompt(), english
+
+
+def build_shorten_request(english, arabic, max_words, require_opening=True):
+    """Request to shorten both halves of an over-long summary to max_words per language."""
+    return get_shorten_prompt(max_words, require_opening), f"{english}\n---ARABIC_SUMMARY---\n{arabic}"
@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Competency categories, most positive first. Paragraphs follow this order.
+CLEAR_STRENGTH = "Clear Strength"
+POTENTIAL_STRENGTH = "Potential Strength"
+DEVELOPMENT_AREA = "Development Area"
+CATEGORIES = [CLEAR_STRENGTH, POTENTIAL_STRENGTH, DEVELOPMENT_AREA]
+
+CLEAR_STRENGTH_MIN = 4.0
+DEVELOPMENT_AREA_MAX = 2.5
+
+# Paragraph groups used when a person's competencies all fall in one category.
+TOP_HALF = "Top Half"
+BOTTOM_HALF = "Bottom Half"
+
+
+def indicator_id(competency_number, indicator_number):
+    """Short, stable ID for an indicator, e.g. '3.2' for the second indicator of the third competency."""
+    return f"{competency_number}.{indicator_number}"
+
+
+def indicator_reference(schema):
+    """{indicator_id: indicator_text} for the whole cohort, sent once instead of with every person."""
+    return {
+        indicator_id(c, i): str(indicator.text)
+        for c, competency in enumerate(schema, start=1)
+        for i, indicator in enumerate(competency.indicators, start=1)
+    }
+
+
+def _compact_number(value):
+    if pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def score_people(people_data, schema):
+    """
+    Categorises every competency for every person with array operations over the score matrix.
+    Returns (scores, category_index, paragraph_index, category_count), each a people x competencies
+    array except category_count (one per person). Categories index into CATEGORIES; -1 means no score.
+    With two or three categories present, paragraphs follow category order. With only one, the
+    higher-scoring half of the competencies is paragraph 0 and the rest paragraph 1.
+    """
+    scores = people_data.iloc[:, [competency.column for competency in schema]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    has_score = ~np.isnan(scores)
+
+    category_index = np.select(
+        [scores >= CLEAR_STRENGTH_MIN, scores <= DEVELOPMENT_AREA_MAX, has_score],
+        [0, 2, 1],
+        default=-1,
+    )
+
+    present = np.stack([(category_index == k).any(axis=1) for k in range(len(CATEGORIES))], axis=1)
+    category_count = present.sum(axis=1)
+
+    # Paragraph for a category = number of present categories ranked above it.
+    category_rank = np.cumsum(present, axis=1) - 1
+    by_category = np.take_along_axis(category_rank, np.clip(category_index, 0, None), axis=1)
+
+    # Top/bottom halves by score within each person, for the single-category case.
+    score_rank = pd.DataFrame(np.where(has_score, scores, -np.inf)).rank(axis=1, ascending=False, method="first").to_numpy()
+    top_half_size = np.ceil(has_score.sum(axis=1) / 2)[:, None]
+    by_half = np.where(score_rank <= top_half_size, 0, 1)
+
+    paragraph_index = np.where(category_count[:, None] >= 2, by_category, by_half)
+    paragraph_index = np.where(has_score, paragraph_index, -1)
+    return scores, category_index, paragraph_index, category_count
+
+
+def build_compact_payloads(people_data, schema):
+    """
+    Precomputes categories and paragraph grouping for everyone and renders one compact JSON payload
+    per person. Indicator texts are replaced by IDs from indicator_reference. Returns a list of strings
+    aligned with people_data.
+    """
+    scores, category_index, paragraph_index, category_count = score_people(people_data, schema)
+    indicator_columns = [[indicator.column for indicator in competency.indicators] for competency in schema]
+    raw_values = people_data.to_numpy()
+    person_names = people_data.iloc[:, 0].astype(str).tolist()
+
+    payloads = []
+    for row, person_name in enumerate(person_names):
+        single_category = category_count[row] < 2
+        paragraphs = {}
+        for c, competency in enumerate(schema):
+            paragraph = paragraph_index[row, c]
+            if paragraph < 0:
+                continue
+            category = CATEGORIES[category_index[row, c]]
+            if paragraph not in paragraphs and single_category:
+                paragraphs[paragraph] = {"focus": TOP_HALF if paragraph == 0 else BOTTOM_HALF, "category": category, "competencies": []}
+            elif paragraph not in paragraphs:
+                paragraphs[paragraph] = {"focus": category, "competencies": []}
+            paragraphs[paragraph]["competencies"].append({
+                "name": str(competency.name),
+                "score": _compact_number(scores[row, c]),
+                "indicators": {
+                    indicator_id(c + 1, i + 1): _compact_number(pd.to_numeric(raw_values[row, column], errors='coerce'))
+                    for i, column in enumerate(indicator_columns[c])
+                },
+            })
+
+        ordered = []
+        for paragraph in sorted(paragraphs):
+            entry = paragraphs[paragraph]
+            entry["competencies"].sort(key=lambda item: -item["score"])
+            ordered.append(entry)
+
+        payloads.append(json.dumps(
+            {"person": person_name, "categories_present": int(category_count[row]), "paragraphs": ordered},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ))
+    return payloads
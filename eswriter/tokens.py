@@ -0,0 +1,53 @@
+"""Prompt token accounting. Uses tiktoken when available, otherwise a characters-per-token estimate."""
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from .prompts import build_score_payloads
+
+# gpt-4o tokenizer.
+TOKEN_ENCODING = "o200k_base"
+# Rough characters per token for English prose, used when tiktoken is unavailable.
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """The gpt-4o tokenizer, or None if tiktoken is missing or cannot load its encoding file (e.g. offline)."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def compare_score_prompt_tokens(df):
+    """
+    Counts score prompt input tokens for the full-text and the compact layouts of a scores dataframe.
+    For each layout, reports the tokens of the template shared by every person and the average
+    per-person data tokens, and the resulting average tokens per request.
+    """
+    report = {"exact": get_encoding() is not None}
+    for layout, compact in (("full", False), ("compact", True)):
+        template, person_payloads = build_score_payloads(df, compact=compact)
+        template_tokens = count_tokens(template)
+        payload_tokens = [count_tokens(payload) for _, payload in person_payloads]
+        per_person = sum(payload_tokens) / len(payload_tokens) if payload_tokens else 0
+        report["people"] = len(person_payloads)
+        report[layout] = {
+            "template_tokens": template_tokens,
+            "person_tokens": per_person,
+            "request_tokens": template_tokens + per_person,
+        }
+    return report
@@ -0,0 +1,105 @@
+import threading
+
+from .config import TOKEN_PRICES
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class UsageTracker:
+    """
+    Collects token usage and latency for every API call in a run, including the prompt tokens
+    Azure OpenAI served from its prompt cache, so cached-token ratios can be checked per cohort.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = []
+        self.first_token_latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, usage, latency, time_to_first_token=None):
+        """
+        Records the `usage` block of a chat completion and the call's latency in seconds (None for
+        batch results). Streamed calls also report the time to their first content token.
+        """
+        details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+        with self._lock:
+            self.calls += 1
+            if latency is not None:
+                self.latencies.append(latency)
+            if time_to_first_token is not None:
+                self.first_token_latencies.append(time_to_first_token)
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+                self.cached_tokens += (getattr(details, "cached_tokens", None) or 0)
+
+    def merge(self, other):
+        """Adds the calls recorded on another tracker, e.g. one stage's calls into the run's total."""
+        with other._lock:
+            calls, cache_hits = other.calls, other.cache_hits
+            tokens = (other.prompt_tokens, other.cached_tokens, other.completion_tokens)
+            latencies, first_token_latencies = list(other.latencies), list(other.first_token_latencies)
+        with self._lock:
+            self.calls += calls
+            self.cache_hits += cache_hits
+            self.prompt_tokens += tokens[0]
+            self.cached_tokens += tokens[1]
+            self.completion_tokens += tokens[2]
+            self.latencies.extend(latencies)
+            self.first_token_latencies.extend(first_token_latencies)
+
+    def record_cache_hit(self):
+        """A summary served from the local SummaryCache without calling the API."""
+        with self._lock:
+            self.cache_hits += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            first_token_latencies = sorted(self.first_token_latencies)
+            uncached_tokens = self.prompt_tokens - self.cached_tokens
+            cost = (
+                uncached_tokens * TOKEN_PRICES["input"]
+                + self.cached_tokens * TOKEN_PRICES["cached_input"]
+                + self.completion_tokens * TOKEN_PRICES["output"]
+            ) / 1_000_000
+            return {
+                "calls": self.calls,
+                "cache_hits": self.cache_hits,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "completion_tokens": self.completion_tokens,
+                "estimated_cost_usd": cost,
+                "latency_samples": len(latencies),
+                "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_p50": percentile(latencies, 0.50),
+                "latency_p95": percentile(latencies, 0.95),
+                "ttft_samples": len(first_token_latencies),
+                "ttft_p50": percentile(first_token_latencies, 0.50),
+                "ttft_p95": percentile(first_token_latencies, 0.95),
+            }
+
+
+def format_usage_report(summary):
+    """One-paragraph cost/latency report for a finished run. Latency is left out for batch runs, which have none per call."""
+    report = (
+        f"{summary['calls']} API call(s), {summary['cache_hits']} served from the local cache. "
+        f"Prompt tokens: {summary['prompt_tokens']:,} ({summary['cached_tokens']:,} cached, {summary['cached_ratio']:.0%}). "
+        f"Completion tokens: {summary['completion_tokens']:,}. Estimated cost: ${summary['estimated_cost_usd']:.2f}."
+    )
+    if summary["latency_samples"]:
+        report += f" Latency: mean {summary['latency_mean']:.1f}s, p50 {summary['latency_p50']:.1f}s, p95 {summary['latency_p95']:.1f}s."
+    if summary["ttft_samples"]:
+        report += f" First token: p50 {summary['ttft_p50']:.1f}s, p95 {summary['ttft_p95']:.1f}s."
+    return report
@@ -0,0 +1,142 @@
+"""
+Checks on generated summaries, and the smallest follow-up that repairs each kind of failure:
+a missing opening is added locally, a missing Arabic half is requested on its own, an over-long
+summary is sent back to be shortened and only failed API calls and cut-off or malformed responses
+are regenerated in full. A fused comment paragraph written in English only is translated like a
+missing Arabic half; one written in Arabic only means regenerating the response.
+"""
+import pandas as pd
+
+from .checkpoint import COMMENTS_STAGE, FUSED_STAGE, SCORES_STAGE
+from .config import COMMENT_SUMMARY_MAX_WORDS, MAIN_SUMMARY_MAX_WORDS
+from .llm import API_ERROR_RESULT, INCOMPLETE_RESPONSE_MESSAGE, INCOMPLETE_RESPONSE_RESULT, MISSING_ARABIC_MESSAGE, UNPAIRED_COMMENT_MESSAGE
+from .prompts import MANDATORY_OPENING, build_arabic_repair_request, build_shorten_request
+
+API_ERROR_ISSUE = "api_error"
+INCOMPLETE_ISSUE = "incomplete"
+MISSING_ARABIC_ISSUE = "missing_arabic"
+MISSING_OPENING_ISSUE = "missing_opening"
+TOO_LONG_ISSUE = "too_long"
+UNPAIRED_COMMENT_ISSUE = "unpaired_comment"
+# Placeholder texts that mark a failed call anywhere in a cell, e.g. after a comment paragraph was appended.
+PLACEHOLDER_ISSUES = (
+    (API_ERROR_RESULT[0], API_ERROR_ISSUE),
+    (INCOMPLETE_RESPONSE_MESSAGE, INCOMPLETE_ISSUE),
+    (UNPAIRED_COMMENT_MESSAGE, UNPAIRED_COMMENT_ISSUE),
+)
+
+# Result rows record the issues that could not be repaired here; empty for a valid row.
+STATUS_COLUMN = "Status"
+
+# (English word limit, whether the mandatory opening is required) for each stage's responses.
+STAGE_RULES = {
+    SCORES_STAGE: (MAIN_SUMMARY_MAX_WORDS, True),
+    COMMENTS_STAGE: (COMMENT_SUMMARY_MAX_WORDS, False),
+    FUSED_STAGE: (MAIN_SUMMARY_MAX_WORDS + COMMENT_SUMMARY_MAX_WORDS, True),
+}
+# A finished row holds the score summary plus any comment paragraph, like a fused response.
+RESULT_ROW_RULES = STAGE_RULES[FUSED_STAGE]
+
+
+def word_count(text):
+    """English word count, not counting the mandatory opening."""
+    text = text.strip()
+    if text.startswith(MANDATORY_OPENING):
+        text = text[len(MANDATORY_OPENING):]
+    return len(text.split())
+
+
+def validate_summary(english, arabic, max_words, require_opening=True):
+    """Returns the issues found in one (english, arabic) result, or an empty list if it is valid."""
+    english = "" if pd.isna(english) else str(english)
+    arabic = "" if pd.isna(arabic) else str(arabic)
+    if (english, arabic) == API_ERROR_RESULT:
+        return [API_ERROR_ISSUE]
+    if (english, arabic) == INCOMPLETE_RESPONSE_RESULT:
+        return [INCOMPLETE_ISSUE]
+
+    issues = [issue for placeholder, issue in PLACEHOLDER_ISSUES if placeholder in english or placeholder in arabic]
+    if not arabic.strip() or MISSING_ARABIC_MESSAGE in arabic:
+        issues.append(MISSING_ARABIC_ISSUE)
+    if require_opening and not english.lstrip().startswith(MANDATORY_OPENING):
+        issues.append(MISSING_OPENING_ISSUE)
+    if word_count(english) > max_words:
+        issues.append(TOO_LONG_ISSUE)
+    return issues
+
+
+def validate_stage_result(stage, result):
+    """validate_summary with the rules of the stage the result came from."""
+    return validate_summary(*result, *STAGE_RULES[stage])
+
+
+def describe_issues(stage, issues):
+    """Status text for a result row: the stage and its remaining issues, or empty if there are none."""
+    return f"{stage}: {', '.join(issues)}" if issues else ""
+
+
+def add_opening(english):
+    """Local repair for a summary that does not start with the mandatory opening."""
+    return f"{MANDATORY_OPENING}\n\n{english.strip()}"
+
+
+def needs_full_resend(result, issues):
+    """
+    Whether a result can only be fixed by sending its original request again: a failed API call, a
+    cut-off or malformed response, or a comment paragraph missing from the English half.
+    """
+    return (
+        API_ERROR_ISSUE in issues
+        or INCOMPLETE_ISSUE in issues
+        or (UNPAIRED_COMMENT_ISSUE in issues and UNPAIRED_COMMENT_MESSAGE in result[0])
+    )
+
+
+def _needs_arabic(result, issues):
+    return MISSING_ARABIC_ISSUE in issues or (UNPAIRED_COMMENT_ISSUE in issues and UNPAIRED_COMMENT_MESSAGE in result[1])
+
+
+def build_repair_request(stage, result, issues):
+    """
+    The follow-up request for a result's issues, or None if no call is needed. A missing Arabic half,
+    or an Arabic half without the comment paragraph, is requested again from the full English text;
+    otherwise an over-long result is sent back to be shortened. Results that need their original
+    request (see needs_full_resend) are not handled here.
+    """
+    english, arabic = result
+    if needs_full_resend(result, issues):
+        return None
+    if _needs_arabic(result, issues):
+        return build_arabic_repair_request(english)
+    if TOO_LONG_ISSUE in issues:
+        return build_shorten_request(english, arabic, *STAGE_RULES[stage])
+    return None
+
+
+def apply_repair(result, issues, repaired):
+    """Merges a repair response into the result it was requested for."""
+    english, arabic = result
+    repaired_english, repaired_arabic = repaired
+    if repaired in (API_ERROR_RESULT, INCOMPLETE_RESPONSE_RESULT) or repaired_arabic is None or repaired_arabic == MISSING_ARABIC_MESSAGE:
+        return result
+    if _needs_arabic(result, issues):
+        return english, repaired_arabic
+    if not repaired_english.strip():
+        return result
+    return repaired_english, repaired_arabic
+
+
+def find_failed_rows(results_df):
+    """
+    Boolean Series marking the rows of a results dataframe that fail validation or carry a status,
+    such as a comment paragraph that failed and was left out.
+    """
+    statuses = results_df[STATUS_COLUMN] if STATUS_COLUMN in results_df else pd.Series("", index=results_df.index)
+    return pd.Series(
+        [
+            bool(validate_summary(english, arabic, *RESULT_ROW_RULES)) or not (pd.isna(status) or not str(status).strip())
+            for english, arabic, status in zip(results_df['English Summary'], results_df['Arabic Summary'], statuses)
+        ],
+        index=results_df.index,
+        dtype=bool,
+    )
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from eswriter import fake_azure_openai
+from eswriter.excel import get_sample_scores_df
+from eswriter.fake_azure_openai import start_fake_server
+
+
+@pytest.fixture
+def fake_server():
+    """Starts a fake Azure OpenAI server; call it with FakeAzureOpenAIServer options."""
+    servers = []
+
+    def start(**config):
+        server = start_fake_server(**config)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def settings_for():
+    """Azure settings pointing at a fake server."""
+    def settings(server):
+        return {
+            "azure_endpoint": server.base_url,
+            "api_key": "fake",
+            "deployment_name": "gpt-4o",
+            "batch_deployment_name": "gpt-4o",
+        }
+    return settings
+
+
+@pytest.fixture
+def server_draws(monkeypatch):
+    """
+    Replaces the fake server's random draws (throttling, malformed replies, dropped streams) with
+    the given values in order, repeating the last one, e.g. server_draws(0.0, 1.0) to hit only the
+    first request with a rate of 0.5.
+    """
+    def use(*values):
+        draws = iter(values)
+        last = [values[-1]]
+
+        def draw():
+            last[0] = next(draws, last[0])
+            return last[0]
+        monkeypatch.setattr(fake_azure_openai, "random", SimpleNamespace(random=draw))
+    return use
+
+
+@pytest.fixture
+def scores_for():
+    """Scores dataframe in the sample layout, with a copy of the sample person under each given code."""
+    def scores(*people):
+        df = get_sample_scores_df()
+        return pd.concat([df.iloc[:1]] + [df.iloc[[1]].assign(Person=person) for person in people], ignore_index=True)
+    return scores
@@ -0,0 +1,61 @@
+from eswriter.batch import requests_hash, run_llm_calls_in_batch
+from eswriter.checkpoint import SCORES_STAGE, CheckpointJournal
+from eswriter.excel import get_sample_scores_df
+from eswriter.pipeline import process_scores
+from eswriter.validation import STATUS_COLUMN, find_failed_rows
+
+BATCH_OPTIONS = {"execution_mode": "batch", "batch_poll_interval": 0.05, "cache_mode": "bypass"}
+REQUESTS = [("System prompt", f"Person {i}") for i in range(3)]
+
+
+def test_batch_round_trip(fake_server, settings_for):
+    server = fake_server(batch_delay=0.05)
+
+    results_df = process_scores(get_sample_scores_df(), settings_for(server), **BATCH_OPTIONS)
+
+    assert len(server.batches) == 1
+    assert server.stats["completed"] == 0
+    assert results_df["Arabic Summary"].str.len().gt(0).all()
+    assert not find_failed_rows(results_df).any()
+
+
+def test_expired_batch_is_not_resent_interactively(fake_server, tmp_path, settings_for):
+    server = fake_server(batch_delay=0.05, batch_status="expired")
+    journal = CheckpointJournal(str(tmp_path / "run.jsonl"))
+
+    results_df = process_scores(get_sample_scores_df(), settings_for(server), journal=journal, **BATCH_OPTIONS)
+
+    assert server.stats["completed"] == 0
+    assert results_df[STATUS_COLUMN].str.startswith("scores: api_error").all()
+    assert find_failed_rows(results_df).all()
+    # The dead batch is forgotten, so the next run submits a new one.
+    assert journal.pending_batch(SCORES_STAGE, requests_hash(REQUESTS)) is None
+
+
+def test_resumed_dead_batch_is_resubmitted(fake_server, tmp_path, settings_for):
+    server = fake_server(batch_delay=0.05, batch_status="failed")
+    settings = settings_for(server)
+    run_llm_calls_in_batch(REQUESTS, settings, SCORES_STAGE, poll_interval=0.05, cache_mode="bypass")
+    (dead_batch_id,) = server.batches
+
+    journal = CheckpointJournal(str(tmp_path / "run.jsonl"))
+    journal.record_batch(SCORES_STAGE, requests_hash(REQUESTS), dead_batch_id)
+    server.batch_status = "completed"
+    results = run_llm_calls_in_batch(REQUESTS, settings, SCORES_STAGE, journal=journal, poll_interval=0.05, cache_mode="bypass")
+
+    assert len(server.batches) == 2
+    assert all(arabic for _, arabic in results)
+    assert journal.pending_batch(SCORES_STAGE, requests_hash(REQUESTS)) != dead_batch_id
+
+
+def test_journaled_batch_is_resumed_instead_of_resubmitted(fake_server, tmp_path, settings_for):
+    server = fake_server(batch_delay=0.05)
+    settings = settings_for(server)
+    journal = CheckpointJournal(str(tmp_path / "run.jsonl"))
+    first = run_llm_calls_in_batch(REQUESTS, settings, SCORES_STAGE, journal=journal, poll_interval=0.05, cache_mode="bypass")
+
+    resumed = run_llm_calls_in_batch(REQUESTS, settings, SCORES_STAGE, journal=CheckpointJournal(journal.path),
+                                     poll_interval=0.05, cache_mode="bypass")
+
+    assert len(server.batches) == 1
+    assert resumed == first
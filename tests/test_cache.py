@@ -0,0 +1,52 @@
+import time
+
+from eswriter.cache import SummaryCache
+
+
+def make_cache(tmp_path, **options):
+    return SummaryCache(str(tmp_path / "cache.sqlite3"), **options)
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = make_cache(tmp_path)
+    key = SummaryCache.make_key([{"role": "user", "content": "hi"}], "gpt-4o", {"temperature": 0.7})
+
+    assert cache.get(key) is None
+    cache.put(key, "English", "عربي")
+
+    assert cache.get(key) == ("English", "عربي")
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_key_depends_on_deployment_and_params():
+    messages = [{"role": "user", "content": "hi"}]
+    key = SummaryCache.make_key(messages, "gpt-4o", {"temperature": 0.7})
+
+    assert key != SummaryCache.make_key(messages, "gpt-4o-mini", {"temperature": 0.7})
+    assert key != SummaryCache.make_key(messages, "gpt-4o", {"temperature": 0.2})
+
+
+def test_expired_entries_are_misses_and_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_age_days=1)
+    cache.put("old", "English", "Arabic")
+    cache._conn.execute("UPDATE summaries SET created_at = ?", (time.time() - 2 * 86400,))
+    cache._conn.commit()
+
+    assert cache.get("old") is None
+    cache.evict()
+    assert cache.entry_count() == 0
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=25)
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 5, "y" * 5)
+        time.sleep(0.01)
+    cache.get("a")
+
+    cache.evict()
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
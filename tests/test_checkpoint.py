@@ -0,0 +1,51 @@
+import pandas as pd
+
+from eswriter.checkpoint import SCORES_STAGE, CheckpointJournal
+from eswriter.pipeline import process_scores
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = CheckpointJournal(path)
+    journal.record(SCORES_STAGE, "E1", "prompt", "English", "عربي")
+
+    reloaded = CheckpointJournal(path)
+
+    assert reloaded.get(SCORES_STAGE, "E1", "prompt") == ("English", "عربي")
+    assert reloaded.get(SCORES_STAGE, "E1", "changed prompt") is None
+    assert len(reloaded) == 1
+
+
+def test_journal_skips_a_partially_written_line(tmp_path):
+    path = tmp_path / "run.jsonl"
+    CheckpointJournal(str(path)).record(SCORES_STAGE, "E1", "prompt", "English", "عربي")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"stage": "scores", "person": "E2", "prom')
+
+    assert len(CheckpointJournal(str(path))) == 1
+
+
+def test_dropped_batches_are_not_resumed(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = CheckpointJournal(path)
+    journal.record_batch(SCORES_STAGE, "hash", "batch_1")
+    journal.drop_batch(SCORES_STAGE, "hash")
+
+    assert CheckpointJournal(path).pending_batch(SCORES_STAGE, "hash") is None
+
+
+def test_rerun_only_generates_people_missing_from_the_journal(tmp_path, fake_server, settings_for, scores_for):
+    server = fake_server()
+    settings = settings_for(server)
+    df = scores_for("E1", "E2", "E3", "E4")
+    path = str(tmp_path / "run.jsonl")
+
+    first = process_scores(df, settings, journal=CheckpointJournal(path), cache_mode="bypass")
+    assert server.stats["completed"] == 4
+
+    resumed = process_scores(df, settings, journal=CheckpointJournal(path), cache_mode="bypass")
+    assert server.stats["completed"] == 4
+    pd.testing.assert_frame_equal(first, resumed)
+
+    process_scores(scores_for("E1", "E2", "E3", "E4", "E5"), settings, journal=CheckpointJournal(path), cache_mode="bypass")
+    assert server.stats["completed"] == 5
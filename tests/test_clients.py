@@ -0,0 +1,41 @@
+import asyncio
+
+from eswriter.llm import build_messages, connection_stats, get_async_azure_client, get_azure_client
+
+REQUEST = ("System prompt", "Person data")
+
+
+def test_sync_client_is_shared_and_reuses_its_connection(fake_server):
+    server = fake_server()
+    client = get_azure_client(server.base_url, "fake")
+    before = connection_stats.snapshot()
+
+    for _ in range(3):
+        client.chat.completions.create(model="gpt-4o", messages=build_messages(REQUEST))
+
+    after = connection_stats.snapshot()
+    assert get_azure_client(server.base_url, "fake") is client
+    assert after["requests"] - before["requests"] == 3
+    assert after["new_connections"] - before["new_connections"] == 1
+
+
+def test_async_client_is_shared_per_event_loop_and_reuses_its_connection(fake_server):
+    server = fake_server()
+
+    async def run():
+        client = get_async_azure_client(server.base_url, "fake")
+        before = connection_stats.snapshot()
+        for _ in range(3):
+            await client.chat.completions.create(model="gpt-4o", messages=build_messages(REQUEST))
+        after = connection_stats.snapshot()
+        same_client = get_async_azure_client(server.base_url, "fake") is client
+        await client.close()
+        return client, same_client, before, after
+
+    client, same_client, before, after = asyncio.run(run())
+
+    assert same_client
+    assert after["requests"] - before["requests"] == 3
+    assert after["new_connections"] - before["new_connections"] == 1
+    # Connections cannot move between event loops, so a new loop gets its own client.
+    assert asyncio.run(run())[0] is not client
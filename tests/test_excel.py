@@ -0,0 +1,25 @@
+import io
+
+import pandas as pd
+
+from eswriter.excel import dataframe_hash, df_to_excel_bytes, get_sample_comments_df
+
+
+def test_dataframe_hash_follows_the_content():
+    df = get_sample_comments_df()
+
+    assert dataframe_hash(df) == dataframe_hash(df.copy())
+
+    changed = df.copy()
+    changed.loc[0, "Comments"] = "Changed."
+    assert dataframe_hash(changed) != dataframe_hash(df)
+    assert dataframe_hash(df.rename(columns={"Comments": "Notes"})) != dataframe_hash(df)
+
+
+def test_workbook_bytes_round_trip():
+    df = pd.DataFrame({"Person": ["E1", "E2"], "English Summary": ["One.", "Two."], "Status": [None, "scores: too_long"]})
+
+    read_back = pd.read_excel(io.BytesIO(df_to_excel_bytes(df)), engine='openpyxl')
+
+    assert read_back["Person"].tolist() == ["E1", "E2"]
+    assert read_back["Status"].isna().tolist() == [True, False]
@@ -0,0 +1,73 @@
+import pandas as pd
+
+from eswriter.excel import get_sample_comments_df
+from eswriter.incremental import FINGERPRINT_COLUMN, diff_inputs, input_fingerprints
+from eswriter.pipeline import process_scores, regenerate_changed
+
+RUN_OPTIONS = {"cache_mode": "bypass"}
+
+
+def previous_results(scores_df, comments_df=None):
+    fingerprints = input_fingerprints(scores_df, comments_df)
+    return pd.DataFrame({
+        "Person": [person for person, _ in fingerprints.values()],
+        FINGERPRINT_COLUMN: [fingerprint for _, fingerprint in fingerprints.values()],
+    })
+
+
+def test_diff_sorts_people_into_new_changed_unchanged_and_removed(scores_for):
+    previous_df = previous_results(scores_for("E1", "E2", "E3"))
+    scores_df = scores_for("E1", "E2", "E4")
+    scores_df.iloc[2, 1] = 5.0
+
+    diff = diff_inputs(previous_df, scores_df)
+
+    assert diff == {"new": ["E4"], "changed": ["E2"], "unchanged": ["E1"], "removed": ["E3"]}
+
+
+def test_person_codes_are_matched_after_normalisation(scores_for):
+    previous_df = previous_results(scores_for("e1 "))
+
+    diff = diff_inputs(previous_df, scores_for("E1"))
+
+    # The same person, whose score row (including the code cell) has changed.
+    assert diff == {"new": [], "changed": ["E1"], "unchanged": [], "removed": []}
+
+
+def test_changed_comments_mark_a_person_changed(scores_for):
+    scores_df = scores_for("EO1", "E32")
+    comments_df = get_sample_comments_df()
+    previous_df = previous_results(scores_df, comments_df)
+    comments_df.loc[0, "Comments"] = "Now leads the weekly planning meeting."
+
+    diff = diff_inputs(previous_df, scores_df, comments_df)
+
+    assert diff["changed"] == ["EO1"]
+    assert diff["unchanged"] == ["E32"]
+
+
+def test_rows_without_a_fingerprint_are_regenerated(scores_for):
+    previous_df = previous_results(scores_for("E1", "E2"))
+    previous_df.loc[0, FINGERPRINT_COLUMN] = None
+
+    assert diff_inputs(previous_df, scores_for("E1", "E2"))["changed"] == ["E1"]
+    assert diff_inputs(previous_df.drop(columns=FINGERPRINT_COLUMN), scores_for("E1"))["changed"] == ["E1"]
+
+
+def test_no_previous_results_means_everyone_is_new(scores_for):
+    assert diff_inputs(None, scores_for("E1", "E2"))["new"] == ["E1", "E2"]
+
+
+def test_regenerate_changed_reuses_unchanged_rows_and_drops_removed_people(fake_server, settings_for, scores_for):
+    server = fake_server()
+    previous_df = process_scores(scores_for("E1", "E2", "E3"), settings_for(server), **RUN_OPTIONS)
+    previous_df.loc[0, "English Summary"] = "Kept from the previous report."
+    scores_df = scores_for("E1", "E2", "E4")
+    scores_df.iloc[2, 1] = 5.0
+
+    results_df = regenerate_changed(previous_df, scores_df, settings_for(server), fused=False, **RUN_OPTIONS)
+
+    assert server.stats["completed"] == 3 + 2
+    assert results_df["Person"].tolist() == ["E1", "E2", "E4"]
+    assert results_df.at[0, "English Summary"] == "Kept from the previous report."
+    assert results_df[FINGERPRINT_COLUMN].tolist() == [fingerprint for _, fingerprint in input_fingerprints(scores_df).values()]
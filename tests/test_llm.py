@@ -0,0 +1,87 @@
+import json
+
+import httpx
+import pytest
+
+from eswriter.config import MAX_RETRIES
+from eswriter.fake_azure_openai import DEFAULT_JSON_REPLY
+from eswriter.llm import (
+    INCOMPLETE_RESPONSE_RESULT,
+    MISSING_ARABIC_MESSAGE,
+    UNPAIRED_COMMENT_MESSAGE,
+    RateLimitScheduler,
+    is_well_formed,
+    parse_response,
+    request_params,
+    request_summary,
+)
+from eswriter.prompts import FUSED_RESPONSE_FIELDS
+
+
+def test_fused_response_is_split_into_summary_and_comment_paragraphs():
+    english, arabic = parse_response(DEFAULT_JSON_REPLY, structured=True)
+
+    data = json.loads(DEFAULT_JSON_REPLY)
+    assert english.startswith(data[FUSED_RESPONSE_FIELDS[0]])
+    assert arabic.startswith(data[FUSED_RESPONSE_FIELDS[1]])
+
+
+def fused_reply(**fields):
+    return json.dumps({**json.loads(DEFAULT_JSON_REPLY), **fields}, ensure_ascii=False)
+
+
+def test_fused_response_without_arabic_keeps_the_english_comment_paragraph():
+    english, arabic = parse_response(fused_reply(arabic_summary=""), structured=True)
+
+    assert arabic is None
+    assert english.endswith(json.loads(DEFAULT_JSON_REPLY)["english_comment_summary"])
+
+
+def test_comment_paragraph_in_one_language_only_is_marked():
+    english, arabic = parse_response(fused_reply(arabic_comment_summary=""), structured=True)
+    assert arabic.endswith(UNPAIRED_COMMENT_MESSAGE)
+    assert not is_well_formed((english, arabic))
+
+    english, arabic = parse_response(fused_reply(english_comment_summary=""), structured=True)
+    assert english.endswith(UNPAIRED_COMMENT_MESSAGE)
+
+    english, arabic = parse_response(fused_reply(english_comment_summary="", arabic_comment_summary=""), structured=True)
+    assert is_well_formed((english, arabic))
+
+
+def test_truncated_fused_response_is_incomplete():
+    assert parse_response(DEFAULT_JSON_REPLY[:-40], structured=True) == INCOMPLETE_RESPONSE_RESULT
+
+
+def test_response_stopped_at_max_tokens_is_incomplete():
+    assert parse_response(DEFAULT_JSON_REPLY, structured=True, finish_reason="length") == INCOMPLETE_RESPONSE_RESULT
+    assert parse_response("English\n---ARABIC_SUMMARY---\nعربي", finish_reason="length") == INCOMPLETE_RESPONSE_RESULT
+
+
+def test_fused_requests_get_a_larger_token_budget():
+    assert request_params(structured=True)["max_tokens"] > request_params()["max_tokens"]
+
+
+def test_connection_dropped_mid_stream_is_retried(fake_server, settings_for):
+    server = fake_server(stream_drop_rate=1.0)
+    scheduler = RateLimitScheduler(max_concurrency=1, base_delay=0.01, max_delay=0.02)
+
+    with pytest.raises(httpx.TransportError):
+        request_summary(("System prompt", "Person data"), settings_for(server), scheduler=scheduler, stream=True)
+
+    assert scheduler.stats["retries"] == MAX_RETRIES
+    assert scheduler.stats["failures"] == 1
+    assert server.stats["requests"] == MAX_RETRIES + 1
+
+
+def test_stream_completes_after_a_dropped_attempt(fake_server, settings_for, server_draws):
+    server = fake_server(stream_drop_rate=0.5)
+    # Drop the first stream only.
+    server_draws(0.0, 1.0)
+    scheduler = RateLimitScheduler(max_concurrency=1, base_delay=0.01, max_delay=0.02)
+
+    english, arabic = request_summary(("System prompt", "Person data"), settings_for(server), scheduler=scheduler, stream=True)
+
+    assert arabic != MISSING_ARABIC_MESSAGE
+    assert scheduler.stats["retries"] == 1
+    assert server.stats["requests"] == 2
@@ -0,0 +1,48 @@
+import json
+from types import SimpleNamespace
+
+from eswriter.metrics import LATENCY_BUCKETS, RunMetrics, latency_histogram
+from eswriter.usage import UsageTracker
+
+
+def test_latency_histogram_buckets_by_upper_bound():
+    histogram = latency_histogram([0.1, 0.25, 0.3, 3.0, 100.0])
+
+    counts = {bucket["le"]: bucket["count"] for bucket in histogram}
+    assert len(histogram) == len(LATENCY_BUCKETS) + 1
+    assert counts[0.25] == 2
+    assert counts[0.5] == 1
+    assert counts[4.0] == 1
+    assert counts[None] == 1
+
+
+def test_summary_combines_stage_timers_and_calls():
+    metrics = RunMetrics()
+    metrics.add_time("generate:scores", 2.0)
+    metrics.add_time("generate:scores", 4.0)
+    metrics.add_time("read_excel", 0.5)
+    usage = UsageTracker()
+    for latency in (1.0, 2.0, 3.0, 4.0):
+        usage.record(SimpleNamespace(prompt_tokens=100, completion_tokens=50, prompt_tokens_details=None), latency)
+    usage.record_cache_hit()
+    metrics.add_calls(usage, {"requests": 6, "throttled": 2, "retries": 2, "failures": 0}, errors=1)
+
+    summary = metrics.summary()
+
+    assert summary["stages"]["generate:scores"] == {"count": 2, "total_s": 6.0, "max_s": 4.0, "mean_s": 3.0}
+    assert summary["counters"] == {"api_calls": 4, "cache_hits": 1, "api_errors": 1, "throttled": 2, "retries": 2, "failures": 0}
+    assert summary["tokens"] == {"prompt": 400, "cached": 0, "completion": 200}
+    # 200 completion tokens over 10 seconds of calls, and over 6 seconds of generation stages.
+    assert summary["tokens_per_second_per_call"] == 20.0
+    assert summary["tokens_per_second_overall"] == 200 / 6.0
+    assert summary["latency"]["samples"] == 4
+    assert summary["latency"]["max_s"] == 4.0
+    assert sum(bucket["count"] for bucket in summary["latency"]["histogram"]) == 4
+    assert json.loads(metrics.to_json())["counters"] == summary["counters"]
+
+
+def test_empty_run_summary():
+    summary = RunMetrics().summary()
+
+    assert summary["latency"]["samples"] == 0
+    assert summary["tokens_per_second_overall"] == 0.0
@@ -0,0 +1,135 @@
+import json
+import time
+
+import pandas as pd
+
+from eswriter import pipeline
+from eswriter.excel import get_sample_comments_df, get_sample_scores_df
+from eswriter.fake_azure_openai import DEFAULT_JSON_REPLY
+from eswriter.metrics import RunMetrics
+from eswriter.pipeline import process_comments_and_append, process_scores, process_scores_with_comments, run_llm_calls_concurrently
+from eswriter.progress import ProgressReporter
+from eswriter.validation import STATUS_COLUMN, find_failed_rows
+
+RUN_OPTIONS = {"cache_mode": "bypass", "max_workers": 1}
+
+
+def test_concurrent_results_keep_request_order(monkeypatch):
+    def request_summary(request, settings, **options):
+        # Later requests finish first.
+        time.sleep(0.05 * (3 - int(request[1])))
+        return f"English {request[1]}", f"Arabic {request[1]}"
+    monkeypatch.setattr(pipeline, "request_summary", request_summary)
+    finished = []
+
+    results = run_llm_calls_concurrently(
+        [("System prompt", str(idx)) for idx in range(4)], settings={}, max_workers=4, cache_mode="bypass",
+        on_complete=lambda idx, done_count, result, ok: finished.append(idx),
+    )
+
+    assert finished == [3, 2, 1, 0]
+    assert results == [(f"English {idx}", f"Arabic {idx}") for idx in range(4)]
+
+
+def test_missing_arabic_is_repaired_with_a_follow_up_call(fake_server, settings_for, server_draws):
+    server = fake_server(malformed_rate=0.5)
+    # Only the first reply loses its Arabic half.
+    server_draws(0.0, 1.0)
+    metrics = RunMetrics()
+
+    results_df = process_scores(get_sample_scores_df(), settings_for(server), metrics=metrics, **RUN_OPTIONS)
+
+    assert server.stats["completed"] == 2
+    assert metrics.summary()["counters"]["repaired"] == 1
+    assert results_df["Arabic Summary"].str.len().gt(0).all()
+    assert not find_failed_rows(results_df).any()
+
+
+def test_unrepairable_rows_keep_a_status(fake_server, settings_for):
+    server = fake_server(malformed_rate=1.0)
+
+    results_df = process_scores(get_sample_scores_df(), settings_for(server), **RUN_OPTIONS)
+
+    assert results_df[STATUS_COLUMN].tolist() == ["scores: missing_arabic"]
+    assert results_df["Input Fingerprint"].isna().all()
+    assert find_failed_rows(results_df).tolist() == [True]
+
+
+def test_failed_comment_paragraph_is_not_appended(fake_server, settings_for):
+    server = fake_server()
+    # The sample comments are for EO1, the sample person.
+    results_df = process_scores(get_sample_scores_df(), settings_for(server), **RUN_OPTIONS)
+    english = results_df.at[0, "English Summary"]
+
+    # From here on every reply loses its Arabic half, including the repair follow-ups.
+    server.malformed_rate = 1.0
+    results_df = process_comments_and_append(results_df, get_sample_comments_df(), settings_for(server), **RUN_OPTIONS)
+
+    assert results_df.at[0, "English Summary"] == english
+    assert results_df.at[0, STATUS_COLUMN] == "comments: missing_arabic"
+    assert pd.isna(results_df.at[0, "Input Fingerprint"])
+    assert find_failed_rows(results_df).tolist() == [True]
+
+
+def fused_reply(**fields):
+    return json.dumps({**json.loads(DEFAULT_JSON_REPLY), **fields}, ensure_ascii=False)
+
+
+def run_fused(server, settings_for):
+    # The sample comments are for EO1, the sample person.
+    return process_scores_with_comments(get_sample_scores_df(), get_sample_comments_df(), settings_for(server), **RUN_OPTIONS)
+
+
+def test_fused_response_without_arabic_keeps_its_comment_paragraph(fake_server, settings_for, server_draws):
+    server = fake_server(malformed_rate=0.5)
+    # Only the fused reply loses its Arabic summary; the translation follow-up is intact.
+    server_draws(0.0, 1.0)
+
+    results_df = run_fused(server, settings_for)
+
+    assert server.stats["completed"] == 2
+    assert results_df.at[0, "English Summary"].endswith(json.loads(DEFAULT_JSON_REPLY)["english_comment_summary"])
+    assert not find_failed_rows(results_df).any()
+
+
+def test_english_only_comment_paragraph_is_translated(fake_server, settings_for):
+    server = fake_server(json_reply=fused_reply(arabic_comment_summary=""))
+
+    results_df = run_fused(server, settings_for)
+
+    assert server.stats["completed"] == 2
+    assert not find_failed_rows(results_df).any()
+
+
+def test_arabic_only_comment_paragraph_is_resent_and_flagged(fake_server, settings_for):
+    server = fake_server(json_reply=fused_reply(english_comment_summary=""))
+
+    results_df = run_fused(server, settings_for)
+
+    assert server.stats["completed"] == 2
+    assert results_df.at[0, STATUS_COLUMN] == "fused: unpaired_comment"
+    assert pd.isna(results_df.at[0, "Input Fingerprint"])
+    assert find_failed_rows(results_df).tolist() == [True]
+
+
+class RecordingReporter(ProgressReporter):
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+
+def test_a_run_ends_with_one_usage_report(fake_server, settings_for, server_draws, scores_for):
+    server = fake_server(malformed_rate=0.5)
+    # The fused reply for EO1 needs an Arabic repair; E2 has no comments and gets a plain request.
+    server_draws(0.0, 1.0)
+    reporter = RecordingReporter()
+
+    process_scores_with_comments(scores_for("EO1", "E2"), get_sample_comments_df(), settings_for(server), reporter=reporter, **RUN_OPTIONS)
+
+    usage_reports = [message for message in reporter.messages if "API call(s)" in message]
+    assert server.stats["completed"] == 3
+    assert len(usage_reports) == 1
+    assert usage_reports[0].startswith("3 API call(s)")
+    assert reporter.messages[-1] == usage_reports[0]
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from eswriter.excel import get_sample_scores_df
+from eswriter.prompts import build_score_requests, index_comments, normalize_person_code, parse_score_schema
+
+
+def test_blank_score_cell_renders_as_nan():
+    df = get_sample_scores_df()
+    df.iloc[1, 3] = np.nan
+
+    (person_name, (system_prompt, user_content)), = build_score_requests(df, compact=False)
+
+    assert person_name == "EO1"
+    assert isinstance(user_content, str)
+    assert f"'{df.iloc[0, 3]}' | Score: nan" in user_content
+
+
+def test_blank_score_cell_in_compact_payload():
+    df = get_sample_scores_df()
+    df.iloc[1, 3] = np.nan
+
+    (person_name, (system_prompt, user_content)), = build_score_requests(df, compact=True)
+
+    payload = json.loads(user_content)
+    competencies = {competency["name"]: competency for paragraph in payload["paragraphs"] for competency in paragraph["competencies"]}
+    assert payload["person"] == "EO1"
+    assert competencies["Adaptability"]["score"] == 4
+    assert competencies["Adaptability"]["indicators"] == {"1.1": 4, "1.2": None, "1.3": 4, "1.4": 4}
+
+
+def test_schema_groups_indicators_under_their_competency():
+    schema = parse_score_schema(get_sample_scores_df())
+
+    assert len(schema) == 8
+    assert schema[0].name == "Adaptability"
+    assert [indicator.column for indicator in schema[0].indicators] == [2, 3, 4, 5]
+
+
+def test_schema_rejects_unrecognised_layout():
+    df = get_sample_scores_df().rename(columns={"Adaptability 1": "Change leadership"})
+
+    with pytest.raises(ValueError, match="Change leadership"):
+        parse_score_schema(df)
+
+
+def test_schema_accepts_competency_matching_definition_row():
+    df = pd.DataFrame({"Person": ["Indicator Text", "EO1"], "Focus": ["Focus", 3], "Focus 1": ["Plans ahead.", 3]})
+
+    schema = parse_score_schema(df)
+
+    assert [(competency.name, len(competency.indicators)) for competency in schema] == [("Focus", 1)]
+
+
+def test_person_codes_are_normalised_for_matching():
+    assert normalize_person_code(" EO1 ") == normalize_person_code("eo1") == "eo1"
+    assert normalize_person_code(1042.0) == normalize_person_code(1042) == normalize_person_code("1042") == "1042"
+    assert normalize_person_code(10.5) == "10.5"
+    assert normalize_person_code(np.nan) is None
+
+
+def test_comments_are_indexed_by_normalised_code_in_file_order():
+    comments_df = pd.DataFrame({
+        "Person Code": ["EO1", " eo1", 1042.0, None, "E32", "E32"],
+        "Comments": ["First.", "Second.", "Numeric code.", "No person.", np.nan, "Kept."],
+    })
+
+    assert index_comments(comments_df) == {"eo1": ["First.", "Second."], "1042": ["Numeric code."], "e32": ["Kept."]}
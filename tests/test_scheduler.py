@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from eswriter.llm import RateLimitScheduler, parse_retry_after, request_summary
+
+REQUEST = ("System prompt", "Person data")
+
+
+def test_parse_retry_after_prefers_milliseconds():
+    assert parse_retry_after(httpx.Headers({"retry-after-ms": "250", "retry-after": "3"})) == 0.25
+    assert parse_retry_after(httpx.Headers({"retry-after": "3"})) == 3.0
+    assert parse_retry_after(httpx.Headers({})) is None
+
+
+def test_throttle_halves_the_limit_and_successes_restore_it():
+    scheduler = RateLimitScheduler(max_concurrency=8)
+
+    scheduler.on_throttle()
+    scheduler.on_throttle()
+    assert scheduler.limit == 2.0
+
+    for _ in range(100):
+        scheduler.on_success({})
+    assert scheduler.limit == 8.0
+    assert scheduler.stats["throttled"] == 2
+
+
+def test_throttles_of_requests_sent_before_a_decrease_do_not_halve_again():
+    scheduler = RateLimitScheduler(max_concurrency=8)
+    sent_at = [scheduler.acquire() for _ in range(4)]
+
+    for request_sent_at in sent_at:
+        scheduler.on_throttle(sent_at=request_sent_at)
+    assert scheduler.limit == 4.0
+    assert scheduler.stats["throttled"] == 4
+
+    scheduler.on_throttle(sent_at=time.monotonic())
+    assert scheduler.limit == 2.0
+
+
+def test_limit_never_drops_below_one():
+    scheduler = RateLimitScheduler(max_concurrency=2)
+    for _ in range(5):
+        scheduler.on_throttle()
+    assert scheduler.limit == 1.0
+
+
+def test_no_growth_while_the_quota_is_nearly_spent():
+    scheduler = RateLimitScheduler(max_concurrency=4)
+    scheduler.on_throttle()
+
+    scheduler.on_success({"x-ratelimit-remaining-requests": "0"})
+    assert scheduler.limit == 2.0
+
+
+def test_retry_after_pauses_every_worker():
+    scheduler = RateLimitScheduler(max_concurrency=4)
+    scheduler.on_throttle(retry_after=0.3)
+
+    started = time.monotonic()
+    scheduler.acquire()
+    scheduler.release()
+    assert time.monotonic() - started >= 0.25
+
+
+def test_acquire_blocks_at_the_limit():
+    scheduler = RateLimitScheduler(max_concurrency=1)
+    scheduler.acquire()
+    acquired = threading.Event()
+
+    def worker():
+        scheduler.acquire()
+        acquired.set()
+        scheduler.release()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    scheduler.release()
+    assert acquired.wait(1.0)
+    thread.join()
+
+
+def test_429_with_retry_after_is_retried_against_the_fake_server(fake_server, settings_for, server_draws):
+    server = fake_server(throttle_rate=0.5, retry_after=0.3)
+    # Throttle the first request only.
+    server_draws(0.0, 1.0)
+    scheduler = RateLimitScheduler(max_concurrency=4, base_delay=0.01)
+
+    started = time.monotonic()
+    english, arabic = request_summary(REQUEST, settings_for(server), scheduler=scheduler)
+
+    assert arabic
+    assert time.monotonic() - started >= 0.3
+    assert scheduler.stats == {"requests": 2, "throttled": 1, "retries": 1, "failures": 0}
+    assert scheduler.limit < 4
+    assert server.stats["throttled"] == 1
+
+    for _ in range(10):
+        request_summary(REQUEST, settings_for(server), scheduler=scheduler)
+    assert scheduler.limit == 4.0
+
+
+def test_exhausted_quota_window_halves_the_limit_once(fake_server, settings_for):
+    server = fake_server(rpm=4)
+    server.window_seconds = 1.5
+    scheduler = RateLimitScheduler(max_concurrency=8, base_delay=0.01)
+    limits = []
+    on_throttle = scheduler.on_throttle
+
+    def record_limit(*args, **kwargs):
+        on_throttle(*args, **kwargs)
+        limits.append(scheduler.limit)
+    scheduler.on_throttle = record_limit
+
+    # Eight requests sent together: four fit in the window and the rest get 429s from the same window.
+    # A worker that only starts after the first 429 waits out the Retry-After pause instead.
+    server.window_start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: request_summary(REQUEST, settings_for(server), scheduler=scheduler), range(8)))
+
+    assert all(arabic for _, arabic in results)
+    assert scheduler.stats["throttled"] >= 2
+    assert scheduler.stats["failures"] == 0
+    assert limits == [4.0] * len(limits)
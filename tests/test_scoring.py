@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from eswriter.prompts import parse_score_schema, select_people
+from eswriter.scoring import CATEGORIES, CLEAR_STRENGTH, DEVELOPMENT_AREA, POTENTIAL_STRENGTH, score_people
+
+
+@pytest.fixture
+def people_with(scores_for):
+    """(people_data, schema) for the sample layout, one person per tuple of competency scores."""
+    def people(*competency_scores):
+        df = scores_for(*(f"E{i}" for i in range(len(competency_scores)))).astype(object)
+        schema = parse_score_schema(df)
+        for row, scores in enumerate(competency_scores, start=1):
+            for competency, score in zip(schema, scores):
+                df.iat[row, competency.column] = score
+        return select_people(df), schema
+    return people
+
+
+def categories(category_index):
+    return [CATEGORIES[k] if k >= 0 else None for k in category_index]
+
+
+def test_category_thresholds(people_with):
+    people_data, schema = people_with((4.0, 3.9, 2.6, 2.5, 5, 1, 3, 4.5))
+
+    _, category_index, _, category_count = score_people(people_data, schema)
+
+    assert categories(category_index[0]) == [
+        CLEAR_STRENGTH, POTENTIAL_STRENGTH, POTENTIAL_STRENGTH, DEVELOPMENT_AREA,
+        CLEAR_STRENGTH, DEVELOPMENT_AREA, POTENTIAL_STRENGTH, CLEAR_STRENGTH,
+    ]
+    assert category_count.tolist() == [3]
+
+
+def test_paragraphs_follow_the_categories_present(people_with):
+    people_data, schema = people_with((4.5, 2.0, 4.0, 1.5, 4.2, 2.2, 5.0, 1.0))
+
+    _, _, paragraph_index, category_count = score_people(people_data, schema)
+
+    # No potential strengths, so development areas move up to the second paragraph.
+    assert category_count.tolist() == [2]
+    assert paragraph_index[0].tolist() == [0, 1, 0, 1, 0, 1, 0, 1]
+
+
+def test_single_category_is_split_into_halves_by_score(people_with):
+    people_data, schema = people_with((3.0, 3.5, 3.2, 2.8, 3.9, 3.1, 3.3, 2.9))
+
+    _, category_index, paragraph_index, category_count = score_people(people_data, schema)
+
+    assert set(categories(category_index[0])) == {POTENTIAL_STRENGTH}
+    assert category_count.tolist() == [1]
+    assert paragraph_index[0].tolist() == [1, 0, 0, 1, 0, 1, 0, 1]
+
+
+def test_missing_scores_have_no_category_or_paragraph(people_with):
+    people_data, schema = people_with((4.5, "n/a", None, 2.0, 3.0, 3.0, 3.0, 3.0))
+
+    scores, category_index, paragraph_index, _ = score_people(people_data, schema)
+
+    assert np.isnan(scores[0, 1]) and np.isnan(scores[0, 2])
+    assert category_index[0, 1:3].tolist() == [-1, -1]
+    assert paragraph_index[0, 1:3].tolist() == [-1, -1]
+
+
+def test_people_are_scored_independently(people_with):
+    people_data, schema = people_with((4.5,) * 8, (2.0,) * 4 + (4.5,) * 4)
+
+    _, category_index, _, category_count = score_people(people_data, schema)
+
+    assert category_count.tolist() == [1, 2]
+    assert categories(category_index[1]) == [DEVELOPMENT_AREA] * 4 + [CLEAR_STRENGTH] * 4
@@ -0,0 +1,83 @@
+import pandas as pd
+
+from eswriter.checkpoint import COMMENTS_STAGE, FUSED_STAGE, SCORES_STAGE
+from eswriter.llm import API_ERROR_RESULT, MISSING_ARABIC_MESSAGE, UNPAIRED_COMMENT_MESSAGE
+from eswriter.prompts import MANDATORY_OPENING
+from eswriter.validation import (
+    API_ERROR_ISSUE,
+    MISSING_ARABIC_ISSUE,
+    MISSING_OPENING_ISSUE,
+    STATUS_COLUMN,
+    TOO_LONG_ISSUE,
+    UNPAIRED_COMMENT_ISSUE,
+    apply_repair,
+    build_repair_request,
+    find_failed_rows,
+    needs_full_resend,
+    validate_stage_result,
+    validate_summary,
+)
+
+VALID_ENGLISH = f"{MANDATORY_OPENING}\n\nShows clear strength in strategic thinking."
+VALID_ARABIC = "يظهر قوة واضحة في التفكير الاستراتيجي."
+
+
+def results_df(rows, status=None):
+    df = pd.DataFrame(rows, columns=["Person", "English Summary", "Arabic Summary"])
+    if status is not None:
+        df[STATUS_COLUMN] = status
+    return df
+
+
+def test_valid_summary_has_no_issues():
+    assert validate_summary(VALID_ENGLISH, VALID_ARABIC, 400) == []
+
+
+def test_summary_issues():
+    assert validate_summary(*API_ERROR_RESULT, 400) == [API_ERROR_ISSUE]
+    assert validate_summary(VALID_ENGLISH, MISSING_ARABIC_MESSAGE, 400) == [MISSING_ARABIC_ISSUE]
+    assert validate_summary("No opening here.", VALID_ARABIC, 400) == [MISSING_OPENING_ISSUE]
+    assert validate_summary(VALID_ENGLISH + " word" * 400, VALID_ARABIC, 400) == [TOO_LONG_ISSUE]
+
+
+def test_unpaired_comment_paragraph_is_repaired_from_the_side_that_has_it():
+    english_only = (f"{VALID_ENGLISH}\n\nAdditionally, feedback suggests more delegation.", f"{VALID_ARABIC}\n\n{UNPAIRED_COMMENT_MESSAGE}")
+    issues = validate_stage_result(FUSED_STAGE, english_only)
+    assert issues == [UNPAIRED_COMMENT_ISSUE]
+    assert not needs_full_resend(english_only, issues)
+    assert build_repair_request(FUSED_STAGE, english_only, issues)[1] == english_only[0]
+    assert apply_repair(english_only, issues, ("", "ترجمة كاملة")) == (english_only[0], "ترجمة كاملة")
+
+    arabic_only = (f"{VALID_ENGLISH}\n\n{UNPAIRED_COMMENT_MESSAGE}", f"{VALID_ARABIC}\n\nفقرة التعليقات.")
+    issues = validate_stage_result(FUSED_STAGE, arabic_only)
+    assert needs_full_resend(arabic_only, issues)
+    assert build_repair_request(FUSED_STAGE, arabic_only, issues) is None
+
+
+def test_find_failed_rows_sees_placeholders_embedded_in_a_cell():
+    df = results_df([
+        ("E1", VALID_ENGLISH, VALID_ARABIC),
+        ("E2", f"{VALID_ENGLISH}\n\nAdditionally, feedback suggests more delegation.", f"{VALID_ARABIC}\n\n{MISSING_ARABIC_MESSAGE}"),
+        ("E3", f"{VALID_ENGLISH}\n\n{API_ERROR_RESULT[0]}", f"{VALID_ARABIC}\n\n{API_ERROR_RESULT[1]}"),
+    ])
+
+    assert find_failed_rows(df).tolist() == [False, True, True]
+
+
+def test_find_failed_rows_reads_the_status_column():
+    df = results_df(
+        [("E1", VALID_ENGLISH, VALID_ARABIC), ("E2", VALID_ENGLISH, VALID_ARABIC), ("E3", VALID_ENGLISH, VALID_ARABIC)],
+        status=["", "comments: missing_arabic", float("nan")],
+    )
+
+    assert find_failed_rows(df).tolist() == [False, True, False]
+
+
+def test_shorten_request_only_keeps_the_opening_where_it_is_required():
+    long_result = (VALID_ENGLISH + " word" * 500, VALID_ARABIC)
+
+    score_prompt, _ = build_repair_request(SCORES_STAGE, long_result, [TOO_LONG_ISSUE])
+    comment_prompt, _ = build_repair_request(COMMENTS_STAGE, long_result, [TOO_LONG_ISSUE])
+
+    assert MANDATORY_OPENING in score_prompt
+    assert MANDATORY_OPENING not in comment_prompt